@@ -1,23 +1,39 @@
 from .attribute import *
 from .baseattribute import *
+from .bus import *
+from .cache import *
 from .cistr import *
 from .decorator import *
 from .errors import *
+from .index import *
+from .limiter import *
 from .model import *
 from .modelmeta import *
+from .ref import *
+from .session import *
+from .stats import *
 from .supermodel import *
+from .ttl import *
 from .unset import *
 from .validation import *
 
 __all__ = [
     *attribute.__all__,
     *baseattribute.__all__,
+    *bus.__all__,
+    *cache.__all__,
     *cistr.__all__,
     *decorator.__all__,
     *errors.__all__,
+    *index.__all__,
+    *limiter.__all__,
     *model.__all__,
     *modelmeta.__all__,
+    *ref.__all__,
+    *session.__all__,
+    *stats.__all__,
     *supermodel.__all__,
+    *ttl.__all__,
     *unset.__all__,
     *validation.__all__,
 ]
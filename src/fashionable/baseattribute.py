@@ -21,7 +21,8 @@ class BaseAttribute:
             default: Value = UNSET,
             min: Limiter = UNSET,
             max: Limiter = UNSET,
-            case_insensitive: bool = True
+            case_insensitive: bool = True,
+            index: bool = False
     ):
         self._type = None
         self._strict = None
@@ -29,6 +30,7 @@ class BaseAttribute:
         self._min = None
         self._max = None
         self._case_insensitive = None
+        self._index = None
         self._name = None
         self._ciname = None
         self._private_name = None
@@ -39,6 +41,7 @@ class BaseAttribute:
         self.max = max
         self.default = default
         self.case_insensitive = case_insensitive
+        self.index = index
 
     def __hash__(self) -> int:
         return hash(self.name)
@@ -140,6 +143,19 @@ class BaseAttribute:
         if self.name is not None:
             self.name = self.name
 
+    @property
+    def index(self) -> bool:
+        return self._index
+
+    @index.setter
+    def index(self, value: bool):
+        if not isinstance(value, bool):
+            raise TypeError(
+                "Invalid {}.index: must be a bool, not {}".format(type(self).__name__, type(value).__name__)
+            )
+
+        self._index = value
+
     @property
     def name(self) -> str:
         return self._name
@@ -0,0 +1,281 @@
+from asyncio import get_event_loop
+from collections import deque
+from io import BytesIO
+from logging import getLogger
+from os import getpid, listdir, path, unlink
+from pickle import HIGHEST_PROTOCOL, Unpickler, UnpicklingError, dumps
+from socket import AF_UNIX, SOCK_DGRAM, socket
+from threading import Lock
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
+__all__ = [
+    'Bus',
+    'LocalBroker',
+    'LocalTransport',
+    'Transport',
+    'UnixTransport',
+]
+
+logger = getLogger(__name__)
+
+
+class _Unpickler(Unpickler):
+    def __init__(self, data: bytes, allowed: FrozenSet[Tuple[str, str]]):
+        super().__init__(BytesIO(data))
+        self.allowed = allowed
+
+    def find_class(self, module: str, name: str) -> Any:
+        if (module, name) not in self.allowed:
+            raise UnpicklingError("Forbidden global {}.{}".format(module, name))
+
+        return super().find_class(module, name)
+
+
+class Transport:
+    max_size = None  # type: Optional[int]
+
+    def open(self, receive: Callable[[bytes], None]):
+        raise NotImplementedError
+
+    def send(self, data: bytes):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+
+class LocalBroker:
+    def __init__(self):
+        self.transports = []  # type: List[LocalTransport]
+
+    def send(self, sender: 'LocalTransport', data: bytes):
+        for transport in self.transports:
+            if transport is not sender:
+                get_event_loop().call_soon(transport.receive, data)
+
+
+class LocalTransport(Transport):
+    def __init__(self, broker: LocalBroker):
+        self.broker = broker
+        self.receive = None
+
+    def open(self, receive: Callable[[bytes], None]):
+        self.receive = receive
+        self.broker.transports.append(self)
+
+    def send(self, data: bytes):
+        self.broker.send(self, data)
+
+    def close(self):
+        if self in self.broker.transports:
+            self.broker.transports.remove(self)
+
+
+class UnixTransport(Transport):
+    _suffix = '.sock'
+    _retry_delay = 0.001
+
+    def __init__(self, directory: str, buffer_size: int = 1 << 16):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.max_size = buffer_size
+        self.path = path.join(directory, '{}-{}{}'.format(getpid(), id(self), self._suffix))
+        self.sock = None
+        self.receive = None
+        self.backlog = deque()  # type: deque
+        self.handle = None
+
+    def open(self, receive: Callable[[bytes], None]):
+        self.receive = receive
+        self.sock = socket(AF_UNIX, SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.bind(self.path)
+        get_event_loop().add_reader(self.sock.fileno(), self._read)
+
+    def _read(self):
+        while self.sock is not None:
+            try:
+                data = self.sock.recv(self.buffer_size)
+            except (BlockingIOError, InterruptedError):
+                return
+
+            self.receive(data)
+
+    def send(self, data: bytes):
+        for name in listdir(self.directory):
+            peer = path.join(self.directory, name)
+
+            if name.endswith(self._suffix) and peer != self.path:
+                self._send(peer, data)
+
+    def _send(self, peer: str, data: bytes):
+        try:
+            self.sock.sendto(data, peer)
+        except (BlockingIOError, InterruptedError):
+            self.backlog.append((peer, data))
+
+            if self.handle is None:
+                self.handle = get_event_loop().call_later(self._retry_delay, self._drain)
+        except (ConnectionRefusedError, FileNotFoundError):
+            logger.debug("Dropping stale peer %s", peer)
+
+            try:
+                unlink(peer)
+            except OSError:
+                pass
+        except OSError as exc:
+            logger.warning("Sending to peer %s failed: %r", peer, exc)
+
+    def _drain(self):
+        self.handle = None
+
+        for _ in range(len(self.backlog)):
+            if self.sock is None:
+                break
+
+            self._send(*self.backlog.popleft())
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+        if self.backlog:
+            logger.warning("Closing with %s unsent messages", len(self.backlog))
+            self.backlog.clear()
+
+        if self.sock is not None:
+            get_event_loop().remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+
+            try:
+                unlink(self.path)
+            except OSError:
+                pass
+
+
+class Bus:
+    def __init__(
+            self,
+            transport: Transport,
+            delay: Union[int, float] = 0.01,
+            refresh: bool = False,
+            allowed: Iterable[Tuple[str, str]] = ()
+    ):
+        self.transport = transport
+        self.delay = delay
+        self.refresh = refresh
+        self.allowed = frozenset(allowed)
+        self.models = {}  # type: Dict[str, type]
+        self.names = {}  # type: Dict[type, str]
+        self.pending = {}  # type: Dict[str, Set[Any]]
+        self.handle = None
+        self.scheduled = False
+        self.opened = False
+        self.loop = None
+        self._lock = Lock()
+
+    def register(self, model: type, name: Optional[str] = None):
+        if name is None:
+            name = '{}.{}'.format(model.__module__, model.__qualname__)
+
+        self.models[name] = model
+        self.names[model] = name
+
+    def open(self):
+        if not self.opened:
+            self.loop = get_event_loop()
+            self.transport.open(self._receive)
+            self.opened = True
+
+    def publish(self, model: type, id_: Any):
+        if not self.opened:
+            return
+
+        with self._lock:
+            self.pending.setdefault(self.names[model], set()).add(id_)
+
+            if self.scheduled:
+                return
+
+            self.scheduled = True
+
+        if self.loop is get_event_loop():
+            self._schedule()
+        else:
+            self.loop.call_soon_threadsafe(self._schedule)
+
+    def _schedule(self):
+        with self._lock:
+            if self.scheduled and self.handle is None:
+                self.handle = self.loop.call_later(self.delay, self.flush)
+
+    def flush(self):
+        with self._lock:
+            if self.handle is not None:
+                self.handle.cancel()
+                self.handle = None
+
+            self.scheduled = False
+
+            if not self.pending:
+                return
+
+            logger.debug("Publishing %s", self.pending)
+            items = [(n, i) for n, ids in self.pending.items() for i in ids]
+            self.pending.clear()
+
+        for data in self._encode(items):
+            self.transport.send(data)
+
+    def _encode(self, items: List[Tuple[str, Any]]) -> List[bytes]:
+        message = {}  # type: Dict[str, Optional[List[Any]]]
+
+        for name, id_ in items:
+            message.setdefault(name, []).append(id_)
+
+        data = dumps(message, HIGHEST_PROTOCOL)
+        limit = self.transport.max_size
+
+        if limit is None or len(data) <= limit:
+            return [data]
+
+        if len(items) == 1:
+            logger.warning("Id %r of %s does not fit into a message, evicting all", items[0][1], items[0][0])
+            return [dumps({items[0][0]: None}, HIGHEST_PROTOCOL)]
+
+        half = len(items) // 2
+        return self._encode(items[:half]) + self._encode(items[half:])
+
+    def _receive(self, data: bytes):
+        try:
+            message = _Unpickler(data, self.allowed).load()
+        except Exception as exc:
+            logger.warning("Dropping invalid message: %r", exc)
+            return
+
+        if not isinstance(message, dict):
+            logger.warning("Dropping invalid message: %r", type(message))
+            return
+
+        for name, ids in message.items():
+            model = self.models.get(name)
+
+            if model is None:
+                continue
+
+            if ids is None:
+                ids = set(getattr(model, '.cache')) | set(getattr(model, '.trash'))
+
+            logger.debug("Evicting %s(%s)", name, ids)
+
+            for id_ in ids:
+                # noinspection PyProtectedMember
+                model._evict(id_, self.refresh)
+
+    def close(self):
+        if self.opened:
+            self.flush()
+            self.transport.close()
+            self.opened = False
@@ -0,0 +1,211 @@
+from collections.abc import MutableMapping
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from sqlite3 import connect
+from time import time
+from typing import Any, Iterator, Optional, Union
+
+__all__ = [
+    'CacheBackend',
+    'MemoryCache',
+    'SharedCache',
+    'KeyValueCache',
+]
+
+_MISSING = object()
+
+
+class CacheBackend(MutableMapping):
+    def __init__(self, name: str):
+        self.name = name
+
+    def set(self, id_: Any, model: Any, ttl: Optional[Union[int, float]] = None):
+        self[id_] = model
+
+    def expires(self, id_: Any) -> Optional[float]:
+        return None
+
+    def __getitem__(self, id_: Any) -> Any:
+        raise NotImplementedError
+
+    def __setitem__(self, id_: Any, model: Any):
+        raise NotImplementedError
+
+    def __delitem__(self, id_: Any):
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[Any]:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryCache(dict, CacheBackend):
+    def __init__(self, name: str = ''):
+        super().__init__()
+        self.name = name
+
+    def set(self, id_: Any, model: Any, ttl: Optional[Union[int, float]] = None):
+        self[id_] = model
+
+
+class SharedCache(CacheBackend):
+    _purge_every = 1024
+
+    def __init__(self, path: str, name: str, mmap_size: int = 1 << 26, timeout: Union[int, float] = 5):
+        super().__init__(name)
+        self._sets = 0
+        self._db = connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=OFF')
+        self._db.execute('PRAGMA mmap_size={:d}'.format(mmap_size))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'name TEXT NOT NULL, key BLOB NOT NULL, value BLOB NOT NULL, expires REAL, PRIMARY KEY (name, key)'
+            ')'
+        )
+
+    def set(self, id_: Any, model: Any, ttl: Optional[Union[int, float]] = None):
+        self._db.execute(
+            'INSERT OR REPLACE INTO cache (name, key, value, expires) VALUES (?, ?, ?, ?)',
+            (self.name, dumps(id_, HIGHEST_PROTOCOL), dumps(model, HIGHEST_PROTOCOL), time() + ttl if ttl else None),
+        )
+        self._sets += 1
+
+        if self._sets % self._purge_every == 0:
+            self.purge()
+
+    def purge(self):
+        self._db.execute('DELETE FROM cache WHERE name = ? AND expires < ?', (self.name, time()))
+
+    def expires(self, id_: Any) -> Optional[float]:
+        row = self._db.execute(
+            'SELECT expires FROM cache WHERE name = ? AND key = ?',
+            (self.name, dumps(id_, HIGHEST_PROTOCOL)),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def pop(self, id_: Any, default: Any = _MISSING) -> Any:
+        key = dumps(id_, HIGHEST_PROTOCOL)
+        row = self._db.execute('SELECT value FROM cache WHERE name = ? AND key = ?', (self.name, key)).fetchone()
+
+        if row is None:
+            if default is _MISSING:
+                raise KeyError(id_)
+
+            return default
+
+        self._db.execute('DELETE FROM cache WHERE name = ? AND key = ?', (self.name, key))
+        return loads(row[0])
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache WHERE name = ?', (self.name,))
+
+    def close(self):
+        self._db.close()
+
+    def __getitem__(self, id_: Any) -> Any:
+        row = self._db.execute(
+            'SELECT value FROM cache WHERE name = ? AND key = ? AND (expires IS NULL OR expires > ?)',
+            (self.name, dumps(id_, HIGHEST_PROTOCOL), time()),
+        ).fetchone()
+
+        if row is None:
+            raise KeyError(id_)
+
+        return loads(row[0])
+
+    def __setitem__(self, id_: Any, model: Any):
+        self.set(id_, model)
+
+    def __delitem__(self, id_: Any):
+        cursor = self._db.execute(
+            'DELETE FROM cache WHERE name = ? AND key = ?',
+            (self.name, dumps(id_, HIGHEST_PROTOCOL)),
+        )
+
+        if not cursor.rowcount:
+            raise KeyError(id_)
+
+    def __iter__(self) -> Iterator[Any]:
+        rows = self._db.execute(
+            'SELECT key FROM cache WHERE name = ? AND (expires IS NULL OR expires > ?)',
+            (self.name, time()),
+        ).fetchall()
+
+        for row in rows:
+            yield loads(row[0])
+
+    def __len__(self) -> int:
+        return self._db.execute(
+            'SELECT COUNT(*) FROM cache WHERE name = ? AND (expires IS NULL OR expires > ?)',
+            (self.name, time()),
+        ).fetchone()[0]
+
+
+class KeyValueCache(CacheBackend):
+    def __init__(self, client: Any, name: str, grace: Union[int, float] = 60):
+        super().__init__(name)
+        self._client = client
+        self._grace = grace
+
+    def _key(self, id_: Any) -> str:
+        return '{}:{}'.format(self.name, dumps(id_, HIGHEST_PROTOCOL).hex())
+
+    def set(self, id_: Any, model: Any, ttl: Optional[Union[int, float]] = None):
+        value = dumps((time() + ttl if ttl else None, model), HIGHEST_PROTOCOL)
+
+        if ttl:
+            self._client.set(self._key(id_), value, px=int((ttl + self._grace) * 1000))
+        else:
+            self._client.set(self._key(id_), value)
+
+    def expires(self, id_: Any) -> Optional[float]:
+        value = self._client.get(self._key(id_))
+        return None if value is None else loads(value)[0]
+
+    def pop(self, id_: Any, default: Any = _MISSING) -> Any:
+        key = self._key(id_)
+        value = self._client.get(key)
+
+        if value is None:
+            if default is _MISSING:
+                raise KeyError(id_)
+
+            return default
+
+        self._client.delete(key)
+        return loads(value)[1]
+
+    def __getitem__(self, id_: Any) -> Any:
+        value = self._client.get(self._key(id_))
+
+        if value is not None:
+            expires, model = loads(value)
+
+            if expires is None or expires > time():
+                return model
+
+        raise KeyError(id_)
+
+    def __setitem__(self, id_: Any, model: Any):
+        self.set(id_, model)
+
+    def __delitem__(self, id_: Any):
+        if not self._client.delete(self._key(id_)):
+            raise KeyError(id_)
+
+    def __iter__(self) -> Iterator[Any]:
+        prefix = self.name + ':'
+
+        for key in self._client.scan_iter(match=prefix + '*'):
+            if isinstance(key, bytes):
+                key = key.decode()
+
+            id_ = loads(bytes.fromhex(key[len(prefix):]))
+
+            if id_ in self:
+                yield id_
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
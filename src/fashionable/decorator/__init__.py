@@ -1,10 +1,16 @@
 from .arg import *
 from .fashionable_ import *
 from .func import *
+from .memo import *
+from .policy import *
+from .profile import *
 
 
 __all__ = [
     *arg.__all__,
     *fashionable_.__all__,
     *func.__all__,
+    *memo.__all__,
+    *policy.__all__,
+    *profile.__all__,
 ]
@@ -1,6 +1,10 @@
 from typing import Callable, Optional, Union, overload
 
 from .func import Func
+from .memo import Memo
+from .policy import ValidationPolicy
+from .profile import Profile
+from ..stats import MetricsSink
 from ..typedef import Typing
 
 __all__ = [
@@ -17,6 +21,9 @@ def fashionable(func: Callable) -> Func:
 def fashionable(
         name_: Optional[str] = None,
         case_insensitive_: bool = True,
+        cache_: Union[None, bool, int, Memo] = None,
+        policy_: Optional[ValidationPolicy] = None,
+        profile_: Union[None, bool, MetricsSink, Profile] = None,
         **annotations: Typing
 ) -> Callable[[Callable], Func]:
     ...  # pragma: no cover
@@ -25,12 +32,15 @@ def fashionable(
 def fashionable(
         name_: Union[Optional[str], Callable] = None,
         case_insensitive_: bool = True,
+        cache_: Union[None, bool, int, Memo] = None,
+        policy_: Optional[ValidationPolicy] = None,
+        profile_: Union[None, bool, MetricsSink, Profile] = None,
         **annotations: Typing
 ) -> Callable[[Callable], Func]:
     if isinstance(name_, Callable):
         return fashionable()(name_)
 
     def deco(func: Callable) -> Func:
-        return Func.fashionable(func, name_, case_insensitive_, annotations)
+        return Func.fashionable(func, name_, case_insensitive_, annotations, cache_, policy_, profile_)
 
     return deco
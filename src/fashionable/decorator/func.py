@@ -1,14 +1,24 @@
-from asyncio import iscoroutine
+import typing
+from asyncio import Future, ensure_future, gather, iscoroutine, iscoroutinefunction, shield
 from functools import partial
-from inspect import Signature
+from inspect import Signature, isgenerator
 from logging import getLogger
-from typing import Callable, Dict, Optional, Tuple
+from time import perf_counter
+from types import MethodType
+from typing import (
+    Any, AsyncIterable, AsyncIterator, Callable, Dict, Generator, Iterable, Iterator, List, Mapping, Optional, Tuple,
+    Union,
+)
 
 from .arg import Arg
+from .memo import Memo
+from .policy import COERCE, SKIP, VALIDATE, ValidationPolicy
+from .profile import Profile
 from ..cistr import CIStr
-from ..errors import ArgError, InvalidArgError, MissingArgError, RetError, ValidateError
+from ..errors import ArgError, FuncError, InvalidArgError, MissingArgError, RetError, ValidateError
+from ..stats import MetricsSink
 from ..typedef import Args, AsyncRet, Kwargs, Predefined, Ret, Typing, Value
-from ..unset import UNSET
+from ..unset import UNSET, Unset
 from ..validation import validate
 
 __all__ = [
@@ -17,9 +27,95 @@ __all__ = [
 
 logger = getLogger(__name__)
 
+_STREAMS = {
+    getattr(t, '__origin__', None)
+    for t in (Iterable[Any], Iterator[Any], Generator[Any, Any, Any], AsyncIterable[Any], AsyncIterator[Any])
+}
+
+if hasattr(typing, 'AsyncGenerator'):
+    _STREAMS.add(typing.AsyncGenerator[Any, Any].__origin__)
+
+Check = Optional[Callable[[Value], Value]]
+Plan = Tuple[
+    Tuple[Tuple[Arg, Check], ...],
+    Dict[str, Tuple[int, ...]],
+    Dict[str, Tuple[Tuple[Check, ...], Check, Union[Check, Unset]]],
+]
+
+
+def _compile_check(annotation: Typing) -> Check:
+    if annotation is Arg.empty:
+        return None
+
+    if type(annotation) is type:
+        return lambda v: v if isinstance(v, annotation) else validate(annotation, v)
+
+    return partial(validate, annotation)
+
+
+def _compile_coerce(annotation: Typing) -> Check:
+    return _compile_check(annotation) if type(annotation) is type else None
+
+
+def _item_type(annotation: Typing) -> Union[Typing, Unset]:
+    if getattr(annotation, '__origin__', None) in _STREAMS and getattr(annotation, '__args__', None):
+        return annotation.__args__[0]
+
+    return UNSET
+
+
+class _CheckedGenerator:
+    __slots__ = ('_func', '_gen', '_check')
+
+    def __init__(self, func: 'Func', gen: Iterator[Any], check: Check):
+        self._func = func
+        self._gen = gen
+        self._check = check
+
+    def __iter__(self) -> Iterator[Value]:
+        return self
+
+    def __next__(self) -> Value:
+        return self._func._check_item(self._check, next(self._gen))
+
+    def send(self, value: Any) -> Value:
+        return self._func._check_item(self._check, self._gen.send(value))
+
+    def throw(self, *args) -> Value:
+        return self._func._check_item(self._check, self._gen.throw(*args))
+
+    def close(self):
+        self._gen.close()
+
+
+class _CheckedAsyncGenerator:
+    __slots__ = ('_func', '_gen', '_check')
+
+    def __init__(self, func: 'Func', gen: AsyncIterator[Any], check: Check):
+        self._func = func
+        self._gen = gen
+        self._check = check
+
+    def __aiter__(self) -> AsyncIterator[Value]:
+        return self
+
+    async def __anext__(self) -> Value:
+        return self._func._check_item(self._check, await self._gen.__anext__())
+
+    async def asend(self, value: Any) -> Value:
+        return self._func._check_item(self._check, await self._gen.asend(value))
+
+    async def athrow(self, *args) -> Value:
+        return self._func._check_item(self._check, await self._gen.athrow(*args))
+
+    async def aclose(self):
+        await self._gen.aclose()
+
 
 class Func(Signature):
-    __slots__ = ('_func', '_name')
+    __slots__ = ('_func', '_name', '_plan', '_memo', '_is_async', '_policy', '_method', '_profile')
+
+    _max_aliases = 1024
 
     _parameter_cls = Arg
 
@@ -29,14 +125,47 @@ class Func(Signature):
             func: Callable,
             name: Optional[str],
             case_insensitive: bool,
-            annotations: Dict[str, Typing]
+            annotations: Dict[str, Typing],
+            cache: Union[None, bool, int, Memo] = None,
+            policy: Optional[ValidationPolicy] = None,
+            profile: Union[None, bool, MetricsSink, Profile] = None
     ) -> 'Func':
         if not name:
             name = func.__name__
 
+        if cache is True:
+            cache = Memo()
+        elif cache is False:
+            cache = None
+        elif isinstance(cache, int):
+            cache = Memo(cache)
+        elif cache is not None and not isinstance(cache, Memo):
+            raise TypeError("Invalid cache_: must be bool, int or Memo, not {}".format(type(cache).__name__))
+
+        if policy is not None and not isinstance(policy, ValidationPolicy):
+            raise TypeError("Invalid policy_: must be ValidationPolicy, not {}".format(type(policy).__name__))
+
+        if profile is True:
+            profile = Profile()
+        elif profile is False:
+            profile = None
+        elif isinstance(profile, MetricsSink):
+            profile = Profile(profile)
+        elif profile is not None and not isinstance(profile, Profile):
+            raise TypeError(
+                "Invalid profile_: must be bool, MetricsSink or Profile, not {}".format(type(profile).__name__)
+            )
+
+        if profile is not None:
+            profile.register('{}.{}'.format(func.__module__, func.__qualname__))
+
         self = cls.from_callable(func)
         self._func = func
         self._name = name
+        self._memo = cache
+        self._is_async = iscoroutinefunction(func)
+        self._policy = policy
+        self._profile = profile
 
         for parameter in self.parameters.values():
             parameter._annotation = annotations.get(parameter.name, parameter.annotation)
@@ -45,6 +174,7 @@ class Func(Signature):
                 parameter._ciname = CIStr(parameter.name)
 
         self._return_annotation = annotations.get('return_', self.return_annotation)
+        self._compile()
 
         return self
 
@@ -52,6 +182,12 @@ class Func(Signature):
         super().__init__(*args, **kwargs)
         self._func = None
         self._name = None
+        self._plan = None
+        self._memo = None
+        self._is_async = False
+        self._policy = None
+        self._method = None
+        self._profile = None
 
     def __str__(self) -> str:
         return self._name + super().__str__()
@@ -64,7 +200,71 @@ class Func(Signature):
     def name(self) -> str:
         return self._name
 
-    def _validate_arg(self, arg: Arg, value: Value) -> Value:
+    @property
+    def cache(self) -> Optional[Memo]:
+        return self._memo
+
+    @property
+    def policy(self) -> Optional[ValidationPolicy]:
+        return self._policy
+
+    @property
+    def profile(self) -> Optional[Profile]:
+        return self._profile
+
+    def _compile(self) -> Plan:
+        params = tuple((arg, _compile_check(arg.annotation)) for arg in self.parameters.values())
+        aliases = {}  # type: Dict[str, List[int]]
+
+        for index, (arg, _) in enumerate(params):
+            if arg.is_zipped:
+                continue
+
+            for alias in (arg.name, *(arg.ciname.cases() if arg.ciname else ())):
+                indexes = aliases.setdefault(alias, [])
+
+                if index not in indexes:
+                    indexes.append(index)
+
+        ret = self.return_annotation
+        item = _item_type(ret)
+        stream = item is not UNSET
+        modes = {
+            VALIDATE: (
+                tuple(c for _, c in params),
+                _compile_check(ret),
+                _compile_check(item) if stream else UNSET,
+            ),
+            COERCE: (
+                tuple(_compile_coerce(a.annotation) for a, _ in params),
+                _compile_coerce(ret),
+                _compile_coerce(item) if stream else UNSET,
+            ),
+            SKIP: ((None,) * len(params), None, None if stream else UNSET),
+        }
+        self._plan = params, {a: tuple(i) for a, i in aliases.items()}, modes
+
+        if params and params[0][0].kind in (Arg.POSITIONAL_ONLY, Arg.POSITIONAL_OR_KEYWORD):
+            self._method = self._call_method
+        else:
+            self._method = self.__call__
+
+        return self._plan
+
+    def _alias(self, aliases: Dict[str, Tuple[int, ...]], key: str) -> Tuple[int, ...]:
+        params = self._plan[0]
+        indexes = ()
+
+        if any(arg.ciname for arg, _ in params):
+            ciname = CIStr(key)
+            indexes = tuple(i for i, (a, _) in enumerate(params) if not a.is_zipped and a.ciname and a.ciname == ciname)
+
+        if len(aliases) < self._max_aliases:
+            aliases[key] = indexes
+
+        return indexes
+
+    def _validate_arg(self, arg: Arg, value: Value, check: Check = UNSET) -> Value:
         if value is UNSET:
             if arg.default is Arg.empty:
                 err = MissingArgError(func=self._name, arg=arg.name)
@@ -72,53 +272,94 @@ class Func(Signature):
                 raise err
             else:
                 value = arg.default
-        elif arg.annotation is not Arg.empty:
-            try:
-                value = validate(arg.annotation, value)
-            except ValidateError as exc:
-                err = InvalidArgError(func=self._name, arg=arg.name)
-                logger.debug("%s: %s: %s", self, err, exc)
-                raise err from exc
+        else:
+            if check is UNSET:
+                check = _compile_check(arg.annotation)
+
+            if check is not None:
+                try:
+                    value = check(value)
+                except ValidateError as exc:
+                    err = InvalidArgError(func=self._name, arg=arg.name)
+                    logger.debug("%s: %s: %s", self, err, exc)
+                    raise err from exc
 
         return value
 
-    def _validate(self, args: Args, kwargs: Kwargs, predefined: Predefined) -> Tuple[Args, Kwargs]:
+    def _validate(
+            self,
+            args: Args,
+            kwargs: Kwargs,
+            predefined: Predefined,
+            mode: str = VALIDATE,
+            first: Value = UNSET
+    ) -> Tuple[Args, Kwargs]:
+        params, aliases, modes = self._plan or self._compile()
+        checks = modes[mode][0]
         new_args = []
         new_kwargs = {}
+        matched = {}
+        unmatched = {}
         recover_allowed = True
+        position = 0
+        offset = 0
 
-        list_params = list(args)
-        dict_params = dict(kwargs)
+        if first is not UNSET:
+            new_args.append(first)
+            matched[0] = first
+            recover_allowed = False
+            offset = 1
+
+        for key, raw_value in kwargs.items():
+            indexes = aliases.get(key)
+
+            if indexes is None:
+                indexes = self._alias(aliases, key)
+
+            for index in indexes:
+                if index not in matched and (not predefined or params[index][0].annotation not in predefined):
+                    matched[index] = raw_value
+                    break
+            else:
+                unmatched[key] = raw_value
+
+        for index in range(offset, len(params)):
+            arg = params[index][0]
+            check = checks[index]
 
-        for arg in self.parameters.values():  # type: Arg
             if arg.is_zipped:
                 if arg.is_positional:
-                    while list_params:
-                        new_args.append(self._validate_arg(arg, list_params.pop(0)))
+                    for raw_value in args[position:]:
+                        new_args.append(self._validate_arg(arg, raw_value, check))
                         recover_allowed = False
+
+                    position = len(args)
                 else:
-                    for param_name in list(dict_params):
-                        new_kwargs[param_name] = self._validate_arg(arg, dict_params.pop(param_name))
+                    for param_name, raw_value in unmatched.items():
+                        new_kwargs[param_name] = self._validate_arg(arg, raw_value, check)
                         recover_allowed = False
 
+                    unmatched = {}
+
                 continue
 
-            value = predefined.get(arg.annotation, UNSET)
+            value = predefined.get(arg.annotation, UNSET) if predefined else UNSET
 
             if value is UNSET:
-                name = arg.ciname or arg.name
-
-                try:
-                    raw_value = next(dict_params.pop(p) for p in dict_params if name == p)
-                except StopIteration:
-                    raw_value = list_params.pop(0) if list_params else UNSET
+                if index in matched:
+                    raw_value = matched[index]
+                elif position < len(args):
+                    raw_value = args[position]
+                    position += 1
+                else:
+                    raw_value = UNSET
 
                 try:
-                    value = self._validate_arg(arg, raw_value)
+                    value = self._validate_arg(arg, raw_value, check)
                 except ArgError as err:
                     if recover_allowed and (args or kwargs):
                         try:
-                            value = self._validate_arg(arg, (args, kwargs))
+                            value = self._validate_arg(arg, (args, kwargs), check)
                         except ArgError:
                             raise err
                     else:
@@ -133,14 +374,16 @@ class Func(Signature):
 
         return tuple(new_args), new_kwargs
 
-    def _in(self, args: Args, kwargs: Kwargs, predefined: Predefined) -> Ret:
-        args, kwargs = self._validate(args, kwargs, predefined)
+    def _in(self, args: Args, kwargs: Kwargs, predefined: Predefined, mode: str = VALIDATE) -> Ret:
+        args, kwargs = self._validate(args, kwargs, predefined, mode)
         return self._func(*args, **kwargs)
 
-    def _out(self, ret: Value) -> Value:
-        if self.return_annotation is not Signature.empty:
+    def _out(self, ret: Value, mode: str = VALIDATE) -> Value:
+        check = (self._plan or self._compile())[2][mode][1]
+
+        if check is not None:
             try:
-                ret = validate(self.return_annotation, ret)
+                ret = check(ret)
             except ValidateError as exc:
                 err = RetError(func=self._name)
                 logger.debug("%s: %s: %s", self, err, exc)
@@ -148,18 +391,282 @@ class Func(Signature):
 
         return ret
 
-    async def _async_out(self, ret: AsyncRet) -> Value:
-        return self._out(await ret)
+    async def _async_out(self, ret: AsyncRet, mode: str = VALIDATE) -> Value:
+        return self._out(await ret, mode)
 
-    def _call(self, predefined: Predefined, *args: Value, **kwargs: Value) -> Ret:
-        ret = self._in(args, kwargs, predefined)
+    def _check_item(self, check: Check, item: Value) -> Value:
+        try:
+            return check(item)
+        except ValidateError as exc:
+            err = RetError(func=self._name)
+            logger.debug("%s: %s: %s", self, err, exc)
+            raise err from exc
+
+    def _awaitable(self, ret: Ret) -> bool:
+        return iscoroutine(ret) and (self._is_async or not isgenerator(ret))
+
+    def _result(self, ret: Ret, mode: str = VALIDATE) -> Ret:
+        if self._awaitable(ret):
+            return self._async_out(ret, mode)
+
+        check = (self._plan or self._compile())[2][mode][2]
+
+        if check is not UNSET:
+            if hasattr(ret, '__next__'):
+                return ret if check is None else _CheckedGenerator(self, ret, check)
+
+            if hasattr(ret, '__anext__'):
+                return ret if check is None else _CheckedAsyncGenerator(self, ret, check)
+
+        return self._out(ret, mode)
+
+    def _memoized(self, args: Args, kwargs: Kwargs, predefined: Predefined, mode: str = VALIDATE) -> Ret:
+        memo = self._memo
+        args, kwargs = self._validate(args, kwargs, predefined, mode)
+        key = memo.key(args, kwargs)
+
+        if key is UNSET:
+            return self._result(self._func(*args, **kwargs), mode)
+
+        if self._is_async:
+            return self._coalesce(memo, key, args, kwargs, mode)
+
+        value = memo.get(key)
+
+        if value is not UNSET:
+            return value
+
+        ret = self._func(*args, **kwargs)
 
-        if iscoroutine(ret):
-            ret = self._async_out(ret)
+        if self._awaitable(ret):
+            self._is_async = True
+            return self._coalesce(memo, key, args, kwargs, mode, ret)
+
+        value = self._result(ret, mode)
+
+        if hasattr(value, '__next__') or hasattr(value, '__anext__'):
+            memo.count('bypass')
         else:
-            ret = self._out(ret)
+            memo.set(key, value)
 
-        return ret
+        return value
+
+    async def _coalesce(
+            self,
+            memo: Memo,
+            key: Any,
+            args: Args,
+            kwargs: Kwargs,
+            mode: str = VALIDATE,
+            ret: Union[AsyncRet, Unset] = UNSET
+    ) -> Value:
+        value = memo.get(key) if ret is UNSET else UNSET
+
+        if value is not UNSET:
+            return value
+
+        task = memo.pending.get(key)
+
+        if task is not None and ret is not UNSET:
+            ret.close()
+
+        if task is None:
+            task = ensure_future(self._async_out(self._func(*args, **kwargs) if ret is UNSET else ret, mode))
+            task.add_done_callback(partial(self._memoize, memo, key))
+            memo.pending[key] = task
+        else:
+            memo.count('coalesce')
+
+        return await shield(task)
+
+    @staticmethod
+    def _memoize(memo: Memo, key: Any, task: Future):
+        memo.pending.pop(key, None)
+
+        if not task.cancelled() and task.exception() is None:
+            memo.set(key, task.result())
+
+    def _profiled(self, args: Args, kwargs: Kwargs, predefined: Predefined, mode: str = VALIDATE) -> Ret:
+        profile = self._profile
+        profile.count('calls')
+
+        if self._memo is not None:
+            try:
+                return self._memoized(args, kwargs, predefined, mode)
+            except FuncError as err:
+                profile.count(type(err).__name__)
+                raise
+
+        start = perf_counter()
+
+        try:
+            args, kwargs = self._validate(args, kwargs, predefined, mode)
+        except ArgError as err:
+            profile.count(type(err).__name__)
+            raise
+        finally:
+            profile.observe('in', perf_counter() - start)
+
+        if self._is_async:
+            return self._profiled_async(args, kwargs, mode)
+
+        start = perf_counter()
+
+        try:
+            ret = self._func(*args, **kwargs)
+        finally:
+            profile.observe('body', perf_counter() - start)
+
+        start = perf_counter()
+
+        try:
+            return self._result(ret, mode)
+        except RetError as err:
+            profile.count(type(err).__name__)
+            raise
+        finally:
+            profile.observe('out', perf_counter() - start)
+
+    async def _profiled_async(self, args: Args, kwargs: Kwargs, mode: str = VALIDATE) -> Value:
+        profile = self._profile
+        start = perf_counter()
+
+        try:
+            ret = await self._func(*args, **kwargs)
+        finally:
+            profile.observe('body', perf_counter() - start)
+
+        start = perf_counter()
+
+        try:
+            return self._out(ret, mode)
+        except RetError as err:
+            profile.count(type(err).__name__)
+            raise
+        finally:
+            profile.observe('out', perf_counter() - start)
+
+    def _call(self, predefined: Predefined, *args: Value, **kwargs: Value) -> Ret:
+        policy = self._policy or ValidationPolicy.default
+        mode = VALIDATE if policy is None else policy.decide(self._func, args, kwargs)
+
+        if self._profile is not None:
+            return self._profiled(args, kwargs, predefined, mode)
+
+        if self._memo is not None:
+            return self._memoized(args, kwargs, predefined, mode)
+
+        return self._result(self._in(args, kwargs, predefined, mode), mode)
+
+    @staticmethod
+    def _unpack(item: Any) -> Tuple[Args, Kwargs]:
+        if isinstance(item, Mapping):
+            return (), item
+
+        if isinstance(item, tuple):
+            return item, {}
+
+        return (item,), {}
+
+    def map(self, items: Iterable[Any], return_exceptions: bool = False) -> List[Any]:
+        policy = self._policy or ValidationPolicy.default
+        profile = self._profile
+        memo = self._memo
+        results = []
+
+        for item in items:
+            args, kwargs = self._unpack(item)
+
+            try:
+                mode = VALIDATE if policy is None else policy.decide(self._func, args, kwargs)
+
+                if profile is not None:
+                    ret = self._profiled(args, kwargs, {}, mode)
+                elif memo is not None:
+                    ret = self._memoized(args, kwargs, {}, mode)
+                else:
+                    ret = self._result(self._in(args, kwargs, {}, mode), mode)
+            except Exception as exc:
+                if not return_exceptions:
+                    raise
+
+                ret = exc
+
+            results.append(ret)
+
+        return results
+
+    async def amap(self, items: Iterable[Any], limit: int = 10, return_exceptions: bool = False) -> List[Any]:
+        if not isinstance(limit, int) or limit < 1:
+            raise ValueError("Invalid limit: must be positive int, not {!r}".format(limit))
+
+        policy = self._policy or ValidationPolicy.default
+        profile = self._profile
+        memo = self._memo
+        items = list(items)
+        results = [None] * len(items)
+        indexes = iter(range(len(items)))
+
+        async def work():
+            for index in indexes:
+                args, kwargs = self._unpack(items[index])
+
+                try:
+                    mode = VALIDATE if policy is None else policy.decide(self._func, args, kwargs)
+
+                    if profile is not None:
+                        ret = self._profiled(args, kwargs, {}, mode)
+
+                        if self._awaitable(ret):
+                            ret = await ret
+                    elif memo is not None:
+                        ret = self._memoized(args, kwargs, {}, mode)
+
+                        if self._is_async:
+                            ret = await ret
+                    else:
+                        ret = self._in(args, kwargs, {}, mode)
+                        ret = self._out(await ret, mode) if self._awaitable(ret) else self._result(ret, mode)
+                except Exception as exc:
+                    if not return_exceptions:
+                        raise
+
+                    ret = exc
+
+                results[index] = ret
+
+        workers = [ensure_future(work()) for _ in range(min(limit, len(items)))]
+
+        try:
+            await gather(*workers)
+        except BaseException:
+            for worker in workers:
+                worker.cancel()
+
+            raise
+
+        return results
+
+    def _call_method(self, instance: Any, *args: Value, **kwargs: Value) -> Ret:
+        if self._memo is not None or self._profile is not None:
+            return self._call({}, instance, *args, **kwargs)
+
+        policy = self._policy or ValidationPolicy.default
+        mode = VALIDATE if policy is None else policy.decide(self._func, args, kwargs)
+        args, kwargs = self._validate(args, kwargs, {}, mode, instance)
+        return self._result(self._func(*args, **kwargs), mode)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._profile.stats() if self._profile is not None else {}
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> Callable[..., Ret]:
+        if instance is None:
+            return self
+
+        if self._method is None:
+            self._compile()
+
+        return MethodType(self._method, instance)
 
     def __getitem__(self, predefined: Predefined) -> Callable[..., Ret]:
         return partial(self._call, predefined)
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple, Union
+
+from ..model import _freeze
+from ..stats import Stats
+from ..unset import UNSET
+
+__all__ = [
+    'Memo',
+]
+
+
+class Memo:
+    EVICTIONS = ('lru', 'lfu', 'fifo')
+
+    def __init__(
+            self,
+            maxsize: Optional[int] = 128,
+            ttl: Optional[Union[int, float]] = None,
+            eviction: str = 'lru'
+    ):
+        if maxsize is not None and (not isinstance(maxsize, int) or maxsize < 1):
+            raise ValueError("Invalid maxsize: must be positive int or None, not {!r}".format(maxsize))
+
+        if ttl is not None and (not isinstance(ttl, (int, float)) or ttl <= 0):
+            raise ValueError("Invalid ttl: must be positive number or None, not {!r}".format(ttl))
+
+        if eviction not in self.EVICTIONS:
+            raise ValueError("Invalid eviction: must be one of {}, not {!r}".format(self.EVICTIONS, eviction))
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.eviction = eviction
+        self.pending = {}  # type: Dict[Any, Any]
+        self._entries = OrderedDict()  # type: OrderedDict[Any, Tuple[Optional[float], Any]]
+        self._uses = {}  # type: Dict[Any, int]
+        self._stats = Stats()
+
+    def key(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        key = _freeze(args), frozenset((k, _freeze(v)) for k, v in kwargs.items())
+
+        try:
+            hash(key)
+        except TypeError:
+            self._stats.count('bypass')
+            return UNSET
+
+        return key
+
+    def get(self, key: Any) -> Any:
+        entry = self._entries.get(key)
+
+        if entry is not None:
+            expires, value = entry
+
+            if expires is None or expires > monotonic():
+                self._stats.count('hit')
+
+                if self.eviction == 'lru':
+                    self._entries.move_to_end(key)
+                elif self.eviction == 'lfu':
+                    self._uses[key] += 1
+
+                return value
+
+            self._stats.count('expire')
+            self._discard(key)
+
+        self._stats.count('miss')
+        return UNSET
+
+    def set(self, key: Any, value: Any):
+        self._discard(key)
+
+        if self.maxsize is not None:
+            while len(self._entries) >= self.maxsize:
+                self._evict()
+
+        self._entries[key] = (monotonic() + self.ttl if self.ttl else None, value)
+        self._uses[key] = 0
+
+    def count(self, name: str):
+        self._stats.count(name)
+
+    def clear(self):
+        self._entries.clear()
+        self._uses.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._stats.to_dict()['counters']
+        stats['size'] = len(self._entries)
+        return stats
+
+    def _discard(self, key: Any):
+        if self._entries.pop(key, None) is not None:
+            del self._uses[key]
+
+    def _evict(self):
+        if self.eviction == 'lfu':
+            key = min(self._uses, key=self._uses.__getitem__)
+        else:
+            key = next(iter(self._entries))
+
+        self._stats.count('evict')
+        self._discard(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
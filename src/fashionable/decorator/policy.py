@@ -0,0 +1,61 @@
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..stats import Stats
+
+__all__ = [
+    'ValidationPolicy',
+]
+
+VALIDATE = 'validate'
+COERCE = 'coerce'
+SKIP = 'skip'
+
+
+class ValidationPolicy:
+    MODES = ('always', 'sample', 'first', 'coerce')
+
+    default = None  # type: Optional[ValidationPolicy]
+
+    def __init__(self, mode: str = 'always', n: int = 1, max_signatures: int = 1024):
+        if mode not in self.MODES:
+            raise ValueError("Invalid mode: must be one of {}, not {!r}".format(self.MODES, mode))
+
+        if not isinstance(n, int) or n < 1:
+            raise ValueError("Invalid n: must be positive int, not {!r}".format(n))
+
+        self.mode = mode
+        self.n = n
+        self.max_signatures = max_signatures
+        self._calls = {}  # type: Dict[Callable, int]
+        self._signatures = {}  # type: Dict[Tuple[Any, ...], int]
+        self._stats = Stats()
+
+    def decide(self, func: Callable, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+        mode = self.mode
+
+        if mode == 'always':
+            decision = VALIDATE
+        elif mode == 'coerce':
+            decision = COERCE
+        elif mode == 'sample':
+            calls = self._calls.get(func, 0)
+            self._calls[func] = calls + 1
+            decision = SKIP if calls % self.n else VALIDATE
+        else:
+            signature = func, tuple(map(type, args)), tuple((k, type(v)) for k, v in kwargs.items())
+            seen = self._signatures.get(signature, 0)
+            decision = SKIP if seen >= self.n else VALIDATE
+
+            if decision is VALIDATE and (seen or len(self._signatures) < self.max_signatures):
+                self._signatures[signature] = seen + 1
+
+        self._stats.count(decision)
+        return decision
+
+    def clear(self):
+        self._calls.clear()
+        self._signatures.clear()
+        self._stats.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self._stats.to_dict()['counters']
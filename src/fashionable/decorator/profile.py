@@ -0,0 +1,47 @@
+from typing import Any, Dict, Optional, Union
+
+from ..stats import MetricsSink, Stats
+
+__all__ = [
+    'Profile',
+]
+
+Number = Union[int, float]
+
+
+class Profile:
+    registry = {}  # type: Dict[str, Profile]
+
+    def __init__(self, metrics: Optional[MetricsSink] = None):
+        if metrics is not None and not isinstance(metrics, MetricsSink):
+            raise TypeError("Invalid metrics: must be MetricsSink, not {}".format(type(metrics).__name__))
+
+        self.name = ''
+        self.metrics = metrics
+        self._stats = Stats()
+
+    def register(self, name: str):
+        self.name = name
+        self.registry[name] = self
+
+    def count(self, name: str, value: int = 1):
+        self._stats.count(name, value)
+
+        if self.metrics is not None:
+            self.metrics.count(self.name, name, value)
+
+    def observe(self, name: str, value: Number):
+        self._stats.observe(name, value)
+
+        if self.metrics is not None:
+            self.metrics.observe(self.name, name, value)
+
+    def clear(self):
+        self._stats.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._stats.to_dict()
+
+    @classmethod
+    def report(cls) -> Dict[str, Dict[str, Any]]:
+        return {n: p.stats() for n, p in cls.registry.items()}
@@ -1,9 +1,12 @@
+from typing import Any
+
 __all__ = [
     'ArgError',
     'FashionableError',
     'InvalidArgError',
     'MissingArgError',
     'ModelAttributeError',
+    'ModelConflictError',
     'ModelError',
     'ModelTypeError',
     'ModelValueError',
@@ -45,6 +48,11 @@ class ModelAttributeError(ModelError, AttributeError):
         super().__init__(self._concat("missing required attribute %(attr)s", suffix), attr=attr, **kwargs)
 
 
+class ModelConflictError(ModelError):
+    def __init__(self, suffix: str = '', *, version: Any, **kwargs):
+        super().__init__(self._concat("conflicting version %(version)r", suffix), version=version, **kwargs)
+
+
 class FuncError(FashionableError):
     def __init__(self, suffix: str = '', *, func: str, **kwargs):
         super().__init__(self._concat("Invalid usage of %(func)s", suffix), func=func, **kwargs)
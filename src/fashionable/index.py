@@ -0,0 +1,71 @@
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Set
+
+__all__ = [
+    'Index',
+]
+
+
+class Index:
+    __slots__ = ('_values', '_hashed', '_sorted')
+
+    def __init__(self):
+        self._values = {}  # type: Dict[Any, Any]
+        self._hashed = {}  # type: Dict[Any, Set[Any]]
+        self._sorted = []  # type: List[tuple]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, id_: Any) -> bool:
+        return id_ in self._values
+
+    def add(self, id_: Any, value: Any):
+        self.discard(id_)
+        self._values[id_] = value
+
+        try:
+            self._hashed.setdefault(value, set()).add(id_)
+        except TypeError:
+            pass
+
+        try:
+            insort(self._sorted, (value, id_))
+        except TypeError:
+            pass
+
+    def discard(self, id_: Any):
+        if id_ not in self._values:
+            return
+
+        value = self._values.pop(id_)
+
+        try:
+            ids = self._hashed.get(value)
+        except TypeError:
+            ids = None
+
+        if ids is not None:
+            ids.discard(id_)
+
+            if not ids:
+                del self._hashed[value]
+
+        try:
+            index = bisect_left(self._sorted, (value, id_))
+        except TypeError:
+            return
+
+        if index < len(self._sorted) and self._sorted[index] == (value, id_):
+            del self._sorted[index]
+
+    def get(self, value: Any) -> Set[Any]:
+        try:
+            return set(self._hashed.get(value, ()))
+        except TypeError:
+            return {i for i, v in self._values.items() if v == value}
+
+    def range(self, start: Any = None, stop: Any = None) -> List[Any]:
+        first = 0 if start is None else bisect_left(self._sorted, (start,))
+        last = len(self._sorted) if stop is None else bisect_left(self._sorted, (stop,), first)
+        return [id_ for _, id_ in self._sorted[first:last]]
@@ -0,0 +1,104 @@
+from asyncio import AbstractEventLoop, CancelledError, Future, Task, get_event_loop
+from heapq import heapify, heappop, heappush
+from itertools import count
+from threading import Lock
+from typing import List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+try:
+    from asyncio import current_task
+except ImportError:  # pragma: no cover
+    current_task = Task.current_task
+
+__all__ = [
+    'ConcurrencyLimiter',
+]
+
+
+class ConcurrencyLimiter:
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+    def __init__(self, limit: int):
+        if not isinstance(limit, int) or limit < 1:
+            raise ValueError("Invalid limit: must be positive int, not {!r}".format(limit))
+
+        self.limit = limit
+        self.active = 0
+        self._waiters = []  # type: List[Tuple[int, int, AbstractEventLoop, Future, Optional[Task]]]
+        self._promoted = WeakKeyDictionary()  # type: WeakKeyDictionary[Task, int]
+        self._counter = count()
+        self._lock = Lock()
+
+    @property
+    def depth(self) -> int:
+        with self._lock:
+            return sum(1 for _, _, _, f, _ in self._waiters if not f.done())
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        loop = get_event_loop()
+        task = current_task()
+
+        with self._lock:
+            if task is not None:
+                priority = min(priority, self._promoted.pop(task, priority))
+
+            if self.active < self.limit:
+                self.active += 1
+                return
+
+            future = loop.create_future()
+            heappush(self._waiters, (priority, next(self._counter), loop, future, task))
+
+        try:
+            await future
+        except CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                _, _, loop, future, _ = heappop(self._waiters)
+
+                if not future.done():
+                    break
+            else:
+                self.active -= 1
+                return
+
+        try:
+            current = get_event_loop()
+        except RuntimeError:
+            current = None
+
+        if loop is current:
+            self._wake(future)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._wake, future)
+            except RuntimeError:
+                self.release()
+
+    def promote(self, task: Task, priority: int = INTERACTIVE):
+        with self._lock:
+            waiters = self._waiters
+
+            for i, (current, n, loop, future, waiter) in enumerate(waiters):
+                if waiter is task:
+                    if priority < current:
+                        waiters[i] = (priority, n, loop, future, waiter)
+                        heapify(waiters)
+
+                    return
+
+            if not task.done():
+                self._promoted[task] = min(priority, self._promoted.get(task, priority))
+
+    def _wake(self, future: Future):
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
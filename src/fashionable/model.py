@@ -1,17 +1,27 @@
 from copy import deepcopy
+from functools import partial
 from itertools import zip_longest
 from typing import Any, Dict, Iterable, Mapping, Tuple, Union
 
 from .errors import ValidateError
 from .modelmeta import ModelMeta
 from .unset import UNSET
-from .validation import validate
+from .validation import offload, validate
 
 __all__ = [
     'Model',
 ]
 
 
+def _restore(cls: type, values: Tuple[Any, ...]) -> 'Model':
+    model = cls.__new__(cls)
+
+    for attr, value in zip(getattr(cls, '.attributes'), values):
+        setattr(model, attr.private_name, value)
+
+    return model
+
+
 class Model(metaclass=ModelMeta):
     @classmethod
     def _to_dict(cls, obj: Any) -> dict:
@@ -24,6 +34,10 @@ class Model(metaclass=ModelMeta):
 
         return obj
 
+    @classmethod
+    async def acreate(cls, *args, **kwargs) -> 'Model':
+        return await offload(partial(cls, *args, **kwargs), (args, kwargs))
+
     def __init__(self, *args, **kwargs):
         attributes = getattr(self, '.attributes')
 
@@ -62,6 +76,9 @@ class Model(metaclass=ModelMeta):
     def __deepcopy__(self, *args, **kwargs) -> 'Model':
         return type(self)(**{k: deepcopy(v) for k, v in self})
 
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return _restore, (type(self), tuple(getattr(self, a.private_name) for a in getattr(self, '.attributes')))
+
     def _id(self):
         return getattr(self, getattr(self, '.attributes')[0].name)
 
@@ -69,3 +86,19 @@ class Model(metaclass=ModelMeta):
         return {n: self._to_dict(v) for n, v in self}
 
     toDict = to_dict
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, Model):
+        return type(value), tuple((n, _freeze(v)) for n, v in value)
+
+    if isinstance(value, dict):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+
+    return value
@@ -0,0 +1,79 @@
+from typing import Any, Dict, Optional, Tuple
+
+from .validation import validate
+
+__all__ = [
+    'Ref',
+]
+
+_refs = {}  # type: Dict[Tuple[type, type], type]
+
+
+def _restore(target: type, id_: Any) -> 'Ref':
+    return Ref[target](id_)
+
+
+class RefMeta(type):
+    def __getitem__(cls, target: type) -> type:
+        if cls.target is not None:
+            raise TypeError("{} is already parametrized".format(cls.__name__))
+
+        if not isinstance(target, type) or not hasattr(target, '.attributes'):
+            raise TypeError("Invalid Ref target: must be a Model, not {!r}".format(target))
+
+        key = (cls, target)
+
+        if key not in _refs:
+            name = '{}[{}]'.format(cls.__name__, target.__name__)
+            _refs[key] = type(cls)(name, (cls,), {'__slots__': (), 'target': target})
+
+        return _refs[key]
+
+
+class Ref(metaclass=RefMeta):
+    __slots__ = ('id',)
+
+    target = None  # type: Optional[type]
+
+    def __init__(self, value: Any):
+        target = self.target
+
+        if target is None:
+            raise TypeError("{} must be parametrized".format(type(self).__name__))
+
+        if isinstance(value, Ref):
+            value = value.id
+        elif isinstance(value, target):
+            value = value._id()
+        else:
+            value = validate(getattr(target, '.attributes')[0].type, value)
+
+        self.id = value
+
+    @property
+    def model(self) -> Any:
+        peek = getattr(self.target, 'peek', None)
+        return peek(self.id) if peek is not None else None
+
+    async def get(self) -> Any:
+        return await self.target.get(self.id)
+
+    def to_dict(self) -> Any:
+        return self.id
+
+    toDict = to_dict
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Ref):
+            return self.target is other.target and self.id == other.id
+
+        return self.id == other
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return '{}({!r})'.format(type(self).__name__, self.id)
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return _restore, (self.target, self.id)
@@ -0,0 +1,137 @@
+from asyncio import gather
+from sys import version_info
+from typing import Any, Dict, Optional, Tuple
+
+__all__ = [
+    'Session',
+]
+
+if version_info >= (3, 7):
+    from contextvars import ContextVar
+
+    _current = ContextVar('fashionable.session', default=None)
+
+    def _get_session() -> Optional['Session']:
+        return _current.get()
+
+    def _set_session(session: Optional['Session']) -> Any:
+        return _current.set(session)
+
+    def _reset_session(token: Any):
+        _current.reset(token)
+else:
+    from asyncio import Task
+    from weakref import WeakKeyDictionary
+
+    _sessions = WeakKeyDictionary()
+
+    def _get_session() -> Optional['Session']:
+        return _sessions.get(Task.current_task())
+
+    def _set_session(session: Optional['Session']) -> Any:
+        task = Task.current_task()
+        token = _sessions.get(task)
+        _sessions[task] = session
+        return token
+
+    def _reset_session(token: Any):
+        _sessions[Task.current_task()] = token
+
+
+class Session:
+    def __init__(self, concurrent: bool = False):
+        self.concurrent = concurrent
+        self.identity = {}  # type: Dict[Tuple[type, Any], Any]
+        self.dirty = {}  # type: Dict[type, Dict[Any, Any]]
+        self._token = None
+
+    @staticmethod
+    def current() -> Optional['Session']:
+        return _get_session()
+
+    def get(self, model: type, id_: Any, default: Any = None) -> Any:
+        return self.identity.get((model, id_), default)
+
+    def add(self, model: type, id_: Any, instance: Any) -> Any:
+        if instance is None:
+            return None
+
+        return self.identity.setdefault((model, id_), instance)
+
+    def replace(self, model: type, id_: Any, instance: Any) -> Any:
+        if instance is None:
+            self.identity.pop((model, id_), None)
+        else:
+            self.identity[model, id_] = instance
+
+        return instance
+
+    def mark(self, model: type, id_: Any, instance: Any):
+        self.identity[model, id_] = instance
+        self.dirty.setdefault(model, {})[id_] = instance
+
+    def discard(self, model: type, id_: Any):
+        self.identity.pop((model, id_), None)
+        self.dirty.get(model, {}).pop(id_, None)
+
+    async def flush(self):
+        dirty = [(m, d) for m, d in self.dirty.items() if d]
+        self.dirty = {}
+
+        if self.concurrent:
+            results = await gather(*(self._flush(m, d) for m, d in dirty), return_exceptions=True)
+            errors = [r for r in results if isinstance(r, BaseException)]
+
+            if errors:
+                raise errors[0]
+
+            return
+
+        for i, (model, instances) in enumerate(dirty):
+            try:
+                await self._flush(model, instances)
+            except BaseException:
+                for rest, rest_instances in dirty[i + 1:]:
+                    self._rollback(rest, rest_instances)
+
+                raise
+
+    def rollback(self):
+        for model, instances in self.dirty.items():
+            self._rollback(model, instances)
+
+        self.dirty = {}
+
+    @classmethod
+    async def _flush(cls, model: type, instances: Dict[Any, Any]):
+        try:
+            # noinspection PyProtectedMember
+            await model._backend('_update_many', {id_: i.to_dict() for id_, i in instances.items()})
+        except BaseException:
+            cls._rollback(model, instances)
+            raise
+
+        for id_ in instances:
+            # noinspection PyProtectedMember
+            model._publish(id_)
+
+    @staticmethod
+    def _rollback(model: type, instances: Dict[Any, Any]):
+        for id_ in instances:
+            # noinspection PyProtectedMember
+            model._evict(id_)
+
+    async def __aenter__(self) -> 'Session':
+        self._token = _set_session(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                await self.flush()
+            else:
+                self.rollback()
+        finally:
+            _reset_session(self._token)
+            self._token = None
+            self.identity.clear()
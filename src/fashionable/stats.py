@@ -0,0 +1,78 @@
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Dict, Sequence, Union
+
+__all__ = [
+    'Histogram',
+    'MetricsSink',
+    'Stats',
+]
+
+Number = Union[int, float]
+
+
+class Histogram:
+    __slots__ = ('bounds', 'buckets', 'count', 'sum')
+
+    default_bounds = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+
+    def __init__(self, bounds: Sequence[Number] = default_bounds):
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.
+
+    def observe(self, value: Number):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': dict(zip(self.bounds + (float('inf'),), self.buckets)),
+        }
+
+
+class Stats:
+    __slots__ = ('counters', 'histograms', '_lock')
+
+    def __init__(self):
+        self.counters = {}  # type: Dict[str, int]
+        self.histograms = {}  # type: Dict[str, Histogram]
+        self._lock = Lock()
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: Number):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+
+            self.histograms[name].observe(value)
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {n: h.to_dict() for n, h in self.histograms.items()},
+            }
+
+
+class MetricsSink:
+    def count(self, owner: str, name: str, value: int = 1):
+        pass
+
+    def observe(self, owner: str, name: str, value: Number):
+        pass
+
+    def gauge(self, owner: str, name: str, value: Number):
+        pass
@@ -1,22 +1,52 @@
-from asyncio import get_event_loop
+from asyncio import AbstractEventLoop, CancelledError, Future, Queue, gather, get_event_loop
+from concurrent.futures import Executor, ThreadPoolExecutor
 from copy import copy
+from functools import partial
+from inspect import isawaitable, iscoroutinefunction
+from itertools import islice
 from logging import getLogger
-from typing import Any, AsyncIterator, Dict, Optional, Tuple, Type, Union
+from os import getpid, replace
+from pickle import HIGHEST_PROTOCOL, dump, load
+from threading import RLock
+from time import perf_counter, time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
+from weakref import WeakKeyDictionary
 
-from .model import Model
+from .bus import Bus
+from .cache import CacheBackend, MemoryCache
+from .errors import ModelConflictError
+from .index import Index
+from .limiter import ConcurrencyLimiter
+from .model import Model, _freeze
 from .modelmeta import ModelMeta
-from .unset import UNSET
+from .ref import Ref
+from .session import Session
+from .stats import MetricsSink, Stats
+from .ttl import AdaptiveTTL
+from .unset import UNSET, Unset
+from .validation import offload, validate
 
 __all__ = [
     'logger',
     'SupermodelMeta',
     'SupermodelIterator',
+    'SupermodelChunkIterator',
+    'NOT_MODIFIED',
+    'NotModified',
     'Supermodel',
 ]
 
 logger = getLogger(__name__)
 
 
+class NotModified:
+    def __repr__(self) -> str:
+        return 'NOT_MODIFIED'
+
+
+NOT_MODIFIED = NotModified()
+
+
 class SupermodelMeta(ModelMeta):
     @property
     def _ttl(cls) -> Optional[Union[int, float]]:
@@ -29,82 +59,792 @@ class SupermodelMeta(ModelMeta):
         else:
             raise TypeError("Invalid _ttl: must be int or float, not {}".format(type(value).__name__))
 
+    @property
+    def _negative_ttl(cls) -> Optional[Union[int, float]]:
+        return getattr(cls, '.negative_ttl', cls._ttl)
+
+    @_negative_ttl.setter
+    def _negative_ttl(cls, value: Optional[Union[int, float]]):
+        if value is None or isinstance(value, (int, float)):
+            setattr(cls, '.negative_ttl', value)
+        else:
+            raise TypeError("Invalid _negative_ttl: must be int or float, not {}".format(type(value).__name__))
+
+    @property
+    def _ttl_policy(cls) -> Optional[AdaptiveTTL]:
+        return getattr(cls, '.ttl_policy', None)
+
+    @_ttl_policy.setter
+    def _ttl_policy(cls, value: Optional[AdaptiveTTL]):
+        if value is None or isinstance(value, AdaptiveTTL):
+            setattr(cls, '.ttl_policy', value)
+        else:
+            raise TypeError("Invalid _ttl_policy: must be AdaptiveTTL, not {}".format(type(value).__name__))
+
+    @property
+    def _flush_interval(cls) -> Optional[Union[int, float]]:
+        return getattr(cls, '.flush_interval', None)
+
+    @_flush_interval.setter
+    def _flush_interval(cls, value: Optional[Union[int, float]]):
+        if value is None or isinstance(value, (int, float)):
+            setattr(cls, '.flush_interval', value)
+        else:
+            raise TypeError("Invalid _flush_interval: must be int or float, not {}".format(type(value).__name__))
+
+    @property
+    def _flush_size(cls) -> Optional[int]:
+        return getattr(cls, '.flush_size', None)
+
+    @_flush_size.setter
+    def _flush_size(cls, value: Optional[int]):
+        if value is None or isinstance(value, int):
+            setattr(cls, '.flush_size', value)
+        else:
+            raise TypeError("Invalid _flush_size: must be int, not {}".format(type(value).__name__))
+
+    @property
+    def _find_ttl(cls) -> Optional[Union[int, float]]:
+        return getattr(cls, '.find_ttl', None)
+
+    @_find_ttl.setter
+    def _find_ttl(cls, value: Optional[Union[int, float]]):
+        if value is None or isinstance(value, (int, float)):
+            setattr(cls, '.find_ttl', value)
+        else:
+            raise TypeError("Invalid _find_ttl: must be int or float, not {}".format(type(value).__name__))
+
+    @property
+    def _prefetch(cls) -> Optional[int]:
+        return getattr(cls, '.prefetch', None)
+
+    @_prefetch.setter
+    def _prefetch(cls, value: Optional[int]):
+        if value is None or isinstance(value, int):
+            setattr(cls, '.prefetch', value)
+        else:
+            raise TypeError("Invalid _prefetch: must be int, not {}".format(type(value).__name__))
+
+    @property
+    def _cache_backend(cls) -> Callable[[str], CacheBackend]:
+        return getattr(cls, '.cache_backend', MemoryCache)
+
+    @_cache_backend.setter
+    def _cache_backend(cls, value: Callable[[str], CacheBackend]):
+        if callable(value):
+            setattr(cls, '.cache_backend', value)
+        else:
+            raise TypeError("Invalid _cache_backend: must be callable, not {}".format(type(value).__name__))
+
+    @property
+    def _bus(cls) -> Optional[Bus]:
+        return getattr(cls, '.bus', None)
+
+    @_bus.setter
+    def _bus(cls, value: Optional[Bus]):
+        if value is None or isinstance(value, Bus):
+            setattr(cls, '.bus', value)
+
+            if value is not None:
+                value.register(cls)
+        else:
+            raise TypeError("Invalid _bus: must be Bus, not {}".format(type(value).__name__))
+
+    @property
+    def _metrics(cls) -> Optional[MetricsSink]:
+        return getattr(cls, '.metrics', None)
+
+    @_metrics.setter
+    def _metrics(cls, value: Optional[MetricsSink]):
+        if value is None or isinstance(value, MetricsSink):
+            setattr(cls, '.metrics', value)
+        else:
+            raise TypeError("Invalid _metrics: must be MetricsSink, not {}".format(type(value).__name__))
+
+    @property
+    def _concurrency(cls) -> Optional[ConcurrencyLimiter]:
+        return getattr(cls, '.concurrency', None)
+
+    @_concurrency.setter
+    def _concurrency(cls, value: Optional[Union[int, ConcurrencyLimiter]]):
+        if isinstance(value, int):
+            value = ConcurrencyLimiter(value)
+
+        if value is None or isinstance(value, ConcurrencyLimiter):
+            setattr(cls, '.concurrency', value)
+        else:
+            raise TypeError(
+                "Invalid _concurrency: must be int or ConcurrencyLimiter, not {}".format(type(value).__name__)
+            )
+
+    @property
+    def _executor(cls) -> Optional[Executor]:
+        return getattr(cls, '.executor', None)
+
+    @_executor.setter
+    def _executor(cls, value: Optional[Union[int, Executor]]):
+        owned = None
+
+        if isinstance(value, int):
+            value = owned = ThreadPoolExecutor(value)
+
+        if value is None or isinstance(value, Executor):
+            cls._shutdown_executor()
+            setattr(cls, '.executor', value)
+            setattr(cls, '.owned_executor', owned)
+        else:
+            raise TypeError("Invalid _executor: must be int or Executor, not {}".format(type(value).__name__))
+
+    @property
+    def _chunk_size(cls) -> int:
+        return getattr(cls, '.chunk_size', 100)
+
+    @_chunk_size.setter
+    def _chunk_size(cls, value: int):
+        if isinstance(value, int):
+            setattr(cls, '.chunk_size', value)
+        else:
+            raise TypeError("Invalid _chunk_size: must be int, not {}".format(type(value).__name__))
+
+    @property
+    def _offload(cls) -> Optional[int]:
+        return getattr(cls, '.offload', None)
+
+    @_offload.setter
+    def _offload(cls, value: Optional[int]):
+        if value is None or isinstance(value, int):
+            setattr(cls, '.offload', value)
+        else:
+            raise TypeError("Invalid _offload: must be int, not {}".format(type(value).__name__))
+
+    @property
+    def _version(cls) -> Optional[str]:
+        return getattr(cls, '.version', None)
+
+    @_version.setter
+    def _version(cls, value: Optional[str]):
+        if value is None or isinstance(value, str):
+            setattr(cls, '.version', value)
+        else:
+            raise TypeError("Invalid _version: must be str, not {}".format(type(value).__name__))
+
+    @property
+    def _write_behind(cls) -> bool:
+        return cls._flush_interval is not None or cls._flush_size is not None
+
     def __new__(mcs, name: str, bases: Tuple[type, ...], namespace: Dict[str, Any]) -> type:
         ttl = namespace.pop('_ttl', UNSET)
-        namespace['.cache'] = {}
-        namespace['.trash'] = {}
+        negative_ttl = namespace.pop('_negative_ttl', UNSET)
+        ttl_policy = namespace.pop('_ttl_policy', UNSET)
+        flush_interval = namespace.pop('_flush_interval', UNSET)
+        flush_size = namespace.pop('_flush_size', UNSET)
+        find_ttl = namespace.pop('_find_ttl', UNSET)
+        prefetch = namespace.pop('_prefetch', UNSET)
+        cache_backend = namespace.pop('_cache_backend', UNSET)
+        bus = namespace.pop('_bus', UNSET)
+        metrics = namespace.pop('_metrics', UNSET)
+        concurrency = namespace.pop('_concurrency', UNSET)
+        executor = namespace.pop('_executor', UNSET)
+        chunk_size = namespace.pop('_chunk_size', UNSET)
+        offload_ = namespace.pop('_offload', UNSET)
+        version = namespace.pop('_version', UNSET)
         namespace['.expire_handles'] = {}
-        namespace['.refresh_tasks'] = {}
+        namespace['.refresh_tasks'] = WeakKeyDictionary()
+        namespace['.pending'] = {}
+        namespace['.flush_handle'] = None
+        namespace['.queries'] = {}
+        namespace['.query_handles'] = {}
+        namespace['.query_generation'] = 0
+        namespace['.stats'] = Stats()
+        namespace['.lock'] = RLock()
         cls = super().__new__(mcs, name, bases, namespace)
 
         if ttl is not UNSET:
             cls._ttl = ttl
 
+        if negative_ttl is not UNSET:
+            cls._negative_ttl = negative_ttl
+
+        if ttl_policy is not UNSET:
+            cls._ttl_policy = ttl_policy
+
+        if flush_interval is not UNSET:
+            cls._flush_interval = flush_interval
+
+        if flush_size is not UNSET:
+            cls._flush_size = flush_size
+
+        if find_ttl is not UNSET:
+            cls._find_ttl = find_ttl
+
+        if prefetch is not UNSET:
+            cls._prefetch = prefetch
+
+        if cache_backend is not UNSET:
+            cls._cache_backend = cache_backend
+
+        if metrics is not UNSET:
+            cls._metrics = metrics
+
+        if concurrency is not UNSET:
+            cls._concurrency = concurrency
+
+        if executor is not UNSET:
+            cls._executor = executor
+
+        if chunk_size is not UNSET:
+            cls._chunk_size = chunk_size
+
+        if offload_ is not UNSET:
+            cls._offload = offload_
+
+        if version is not UNSET:
+            cls._version = version
+
+        if bus is not UNSET:
+            cls._bus = bus
+        elif cls._bus is not None:
+            cls._bus.register(cls)
+
+        qualname = '{}.{}'.format(cls.__module__, cls.__qualname__)
+        setattr(cls, '.cache', cls._cache_backend(qualname + '.cache'))
+        setattr(cls, '.trash', cls._cache_backend(qualname + '.trash'))
         return cls
 
+    def __init__(cls, name: str, bases: Tuple[type, ...], namespace: Dict[str, Any]):
+        super().__init__(name, bases, namespace)
+        attributes = getattr(cls, '.attributes')
+
+        if cls._version is not None and all(a.name != cls._version for a in attributes):
+            raise ValueError("Invalid _version: {} has no attribute {}".format(name, cls._version))
+
+        indexed = [a.name for a in attributes if a.index]
+
+        if indexed and not isinstance(getattr(cls, '.cache'), MemoryCache):
+            logger.warning("Ignoring indexes %s of %s: cache is not process-local", indexed, name)
+            indexed = []
+
+        setattr(cls, '.indexes', {n: Index() for n in indexed})
+
+
+def _cancel(scheduled: Tuple[AbstractEventLoop, Any]):
+    loop, handle = scheduled
+
+    try:
+        current = get_event_loop()
+    except RuntimeError:
+        current = None
+
+    if loop is current or loop.is_closed():
+        handle.cancel()
+    else:
+        loop.call_soon_threadsafe(handle.cancel)
+
+
+def _match(value: Any, query: Any) -> bool:
+    if isinstance(query, slice):
+        return (query.start is None or value >= query.start) and (query.stop is None or value < query.stop)
+
+    return value == query
+
+
+class _ListIterator:
+    def __init__(self, items: Iterable[Any]):
+        self.items = iter(items)
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return next(self.items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _ThreadIterator:
+    def __init__(self, items: Iterable[Any], executor: Optional[Executor], size: int):
+        self.items = iter(items)
+        self.executor = executor
+        self.size = size
+        self.chunk = iter(())
+        self.done = False
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self
+
+    async def __anext__(self) -> Any:
+        item = next(self.chunk, UNSET)
+
+        if item is UNSET and not self.done:
+            chunk = await get_event_loop().run_in_executor(self.executor, list, islice(self.items, self.size))
+            self.done = len(chunk) < self.size
+            self.chunk = iter(chunk)
+            item = next(self.chunk, UNSET)
+
+        if item is UNSET:
+            raise StopAsyncIteration
+
+        return item
+
+
+class _IdsIterator:
+    def __init__(self, model: Type['Supermodel'], ids: Iterable[Any]):
+        self.model = model
+        self.ids = iter(ids)
+
+    def __aiter__(self) -> AsyncIterator['Supermodel']:
+        return self
+
+    async def __anext__(self) -> 'Supermodel':
+        for id_ in self.ids:
+            model = await self.model.get(id_)
+
+            if model is not None:
+                return model
+
+        raise StopAsyncIteration
+
 
 class SupermodelIterator:
-    def __init__(self, model: Type['Supermodel'], iterator: AsyncIterator[dict]):
+    def __init__(
+            self,
+            model: Type['Supermodel'],
+            iterator: AsyncIterator[dict],
+            query: Optional[tuple] = None,
+            prefetch: Optional[int] = None
+    ):
         self.model = model
         self.iterator = iterator
         self.iterable = None
+        self.query = query
+        self.ids = []
+        self.size = prefetch
+        self.queue = None
+        self.producer = None
+        self.exc = None
 
     def __aiter__(self) -> AsyncIterator['Supermodel']:
-        self.iterable = self.iterator.__aiter__()
+        if self.iterable is None:
+            self.iterable = self.iterator.__aiter__()
+
+            if self.size:
+                self.queue = Queue(self.size)
+                self.producer = get_event_loop().create_task(self._produce(self.iterable, self.queue))
+
         return self
 
+    def prefetch(self, size: Optional[int]) -> 'SupermodelIterator':
+        self.size = size
+        return self
+
+    def chunks(self, size: int) -> 'SupermodelChunkIterator':
+        return SupermodelChunkIterator(self, size)
+
+    def close(self):
+        producer = self.producer
+        self.producer = None
+
+        if producer is not None and not producer.done():
+            try:
+                producer.cancel()
+            except RuntimeError:
+                pass
+
+    async def aclose(self):
+        self.close()
+
+        if hasattr(self.iterable, 'aclose'):
+            await self.iterable.aclose()
+
+    def __del__(self):
+        self.close()
+
+    @staticmethod
+    async def _produce(iterable: AsyncIterator[dict], queue: Queue):
+        try:
+            while True:
+                await queue.put((await iterable.__anext__(), None))
+        except CancelledError:
+            raise
+        except Exception as exc:
+            await queue.put((None, exc))
+
+    async def _next(self) -> Any:
+        if self.exc is not None:
+            raise self.exc
+
+        if self.queue is None:
+            return await self.iterable.__anext__()
+
+        raw, exc = await self.queue.get()
+
+        if exc is not None:
+            self.exc = exc
+            self.producer = None
+            raise exc
+
+        return raw
+
     async def __anext__(self) -> 'Supermodel':
-        raw = await self.iterable.__anext__()
+        try:
+            raw = await self._next()
+        except StopAsyncIteration:
+            if self.query is not None:
+                # noinspection PyProtectedMember
+                self.model._remember(*self.query, ids=self.ids)
+                self.query = None
+
+            raise
+
+        if isinstance(raw, self.model):
+            return raw
+
         model = self.model(**raw)
+        id_ = model._id()
+        session = Session.current()
+
+        if self.query is not None:
+            self.ids.append(id_)
+
+        if session is not None:
+            existing = session.get(self.model, id_)
+
+            if existing is not None:
+                return existing
+
+            session.add(self.model, id_, model)
+
         # noinspection PyProtectedMember
-        self.model._cache(model._id(), model)
+        self.model._cache(id_, model)
         return model
 
 
+class SupermodelChunkIterator:
+    def __init__(self, iterator: SupermodelIterator, size: int):
+        if not isinstance(size, int) or size < 1:
+            raise ValueError("Invalid chunk size: must be positive int, not {!r}".format(size))
+
+        self.iterator = iterator
+        self.size = size
+        self.iterable = None
+
+    def __aiter__(self) -> AsyncIterator[List['Supermodel']]:
+        self.iterable = self.iterator.__aiter__()
+        return self
+
+    def close(self):
+        self.iterator.close()
+
+    async def aclose(self):
+        await self.iterator.aclose()
+
+    async def __anext__(self) -> List['Supermodel']:
+        chunk = []
+
+        while len(chunk) < self.size:
+            try:
+                chunk.append(await self.iterable.__anext__())
+            except StopAsyncIteration:
+                break
+
+        if not chunk:
+            raise StopAsyncIteration
+
+        return chunk
+
+
 class Supermodel(Model, metaclass=SupermodelMeta):
     @classmethod
-    def _cache(cls, id_: Any, model: Optional['Supermodel'] = None, reset: bool = True):
+    def _cache(
+            cls,
+            id_: Any,
+            model: Optional['Supermodel'] = None,
+            reset: bool = True,
+            ttl: Optional[Union[int, float, Unset]] = UNSET
+    ):
         cache = getattr(cls, '.cache')
         trash = getattr(cls, '.trash')
         expire_handles = getattr(cls, '.expire_handles')
-        refresh_tasks = getattr(cls, '.refresh_tasks')
+        refresh_tasks = cls._refresh_tasks()
+        indexes = getattr(cls, '.indexes')
 
-        if id_ in cache:
-            del cache[id_]
+        with getattr(cls, '.lock'):
+            for index in indexes.values():
+                index.discard(id_)
 
-        if id_ in trash:
-            del trash[id_]
+            evicted = cache.pop(id_, UNSET) is not UNSET
+            evicted = trash.pop(id_, UNSET) is not UNSET or evicted
 
-        if id_ in expire_handles:
-            expire_handles.pop(id_).cancel()
+            if evicted and not reset:
+                cls._count('evict')
 
-        if id_ in refresh_tasks:
-            refresh_tasks.pop(id_).cancel()
+            if id_ in expire_handles:
+                _cancel(expire_handles.pop(id_))
 
-        if reset:
-            if cls._ttl:
-                logger.debug("Creating expire %s(%s)", cls.__name__, id_)
-                expire_handles[id_] = get_event_loop().call_later(cls._ttl, cls._expire, id_)
+            if id_ in refresh_tasks:
+                refresh_tasks.pop(id_).cancel()
 
-            cache[id_] = model
+            if reset:
+                if ttl is UNSET:
+                    ttl = cls._ttl_for(model)
+
+                if ttl:
+                    logger.debug("Creating expire %s(%s)", cls.__name__, id_)
+                    loop = get_event_loop()
+                    expire_handles[id_] = (loop, loop.call_later(ttl, cls._expire, id_))
+
+                cache.set(id_, model, ttl)
+
+                if model is not None:
+                    for name, index in indexes.items():
+                        index.add(id_, getattr(model, name))
+
+    @classmethod
+    def _refresh_tasks(cls) -> Dict[Any, Future]:
+        return getattr(cls, '.refresh_tasks').setdefault(get_event_loop(), {})
+
+    @classmethod
+    def _ttl_for(cls, model: Optional['Supermodel']) -> Optional[Union[int, float]]:
+        if model is None:
+            return cls._negative_ttl
+
+        policy = cls._ttl_policy
+
+        if policy is not None:
+            return policy.ttl(model._id(), cls._ttl)
+
+        return cls._ttl
 
     @classmethod
     def _expire(cls, id_: Any):
         cache = getattr(cls, '.cache')
         trash = getattr(cls, '.trash')
+        expire_handles = getattr(cls, '.expire_handles')
+
+        with getattr(cls, '.lock'):
+            scheduled = expire_handles.get(id_)
+
+            if scheduled is None or scheduled[0] is not get_event_loop():
+                return
+
+            expires = cache.expires(id_)
+
+            if expires is not None and expires > time():
+                loop = scheduled[0]
+                expire_handles[id_] = (loop, loop.call_later(expires - time(), cls._expire, id_))
+                return
+
+            del expire_handles[id_]
+            model = cache.pop(id_, UNSET)
+
+            if model is not UNSET:
+                logger.debug("%s(%s) expired", cls.__name__, id_)
+                cls._count('expire')
+
+                for index in getattr(cls, '.indexes').values():
+                    index.discard(id_)
 
-        if id_ in cache:
-            logger.debug("%s(%s) expired", cls.__name__, id_)
-            trash[id_] = cache.pop(id_)
+                trash.set(id_, model)
 
     @classmethod
-    async def _refresh(cls, id_: Any):
-        raw = await cls._get(id_)
-        model = cls(**raw) if raw else None
-        get_event_loop().call_soon(cls._cache, id_, model)
+    async def _refresh(cls, id_: Any, priority: int = ConcurrencyLimiter.INTERACTIVE, cache: bool = True):
+        pending = getattr(cls, '.pending').get(id_)
+
+        if pending is not None:
+            logger.debug("%s(%s) pending", cls.__name__, id_)
+
+            if cache:
+                get_event_loop().call_soon(cls._cache, id_, pending)
+
+            return pending
+
+        previous = None
+
+        if cls._conditional():
+            previous = getattr(cls, '.cache').get(id_) or getattr(cls, '.trash').get(id_)
+
+        if previous is not None:
+            raw = await cls._backend('_get_if_changed', id_, getattr(previous, cls._version), priority_=priority)
+
+            if raw is NOT_MODIFIED:
+                logger.debug("%s(%s) not modified", cls.__name__, id_)
+                cls._count('not_modified')
+
+                if cache:
+                    get_event_loop().call_soon(cls._cache, id_, previous)
+
+                return previous
+        else:
+            raw = await cls._backend('_get', id_, priority_=priority)
+
+        model = await offload(partial(cls, **raw), raw, cls._offload, cls._executor) if raw else None
+
+        if cache:
+            get_event_loop().call_soon(cls._cache, id_, model)
+
         logger.debug("%s(%s) refreshed", cls.__name__, id_)
         return model
 
+    @classmethod
+    def _remember(cls, key: Any, kwargs: Dict[str, Any], generation: int, ids: List[Any]):
+        if generation != getattr(cls, '.query_generation'):
+            return
+
+        loop = get_event_loop()
+
+        with getattr(cls, '.lock'):
+            cls._forget(key)
+            logger.debug("Remembering %s(%s)", cls.__name__, kwargs)
+            getattr(cls, '.queries')[key] = (kwargs, tuple(ids), frozenset(ids))
+            getattr(cls, '.query_handles')[key] = (loop, loop.call_later(cls._find_ttl, cls._forget, key))
+
+    @classmethod
+    def _forget(cls, key: Any):
+        query_handles = getattr(cls, '.query_handles')
+
+        with getattr(cls, '.lock'):
+            getattr(cls, '.queries').pop(key, None)
+
+            if key in query_handles:
+                _cancel(query_handles.pop(key))
+
+    @classmethod
+    def _invalidate(cls, id_: Any, model: Optional['Supermodel'] = None, publish: bool = True):
+        queries = getattr(cls, '.queries')
+
+        with getattr(cls, '.lock'):
+            setattr(cls, '.query_generation', getattr(cls, '.query_generation') + 1)
+
+            for key, (kwargs, _, ids) in list(queries.items()):
+                if id_ in ids or model is not None and cls._matches(model, **kwargs):
+                    logger.debug("Forgetting %s(%s)", cls.__name__, kwargs)
+                    cls._forget(key)
+
+        if publish:
+            cls._publish(id_)
+
+    @classmethod
+    def _publish(cls, id_: Any):
+        if cls._bus is not None:
+            cls._bus.publish(cls, id_)
+
+    @classmethod
+    def _identity(cls, session: Optional[Session], id_: Any, model: Optional['Supermodel'],
+                  fresh: bool = False) -> Optional['Supermodel']:
+        if session is None:
+            return model
+
+        return session.replace(cls, id_, model) if fresh else session.add(cls, id_, model)
+
+    @classmethod
+    def _evict(cls, id_: Any, refresh: bool = False):
+        with getattr(cls, '.lock'):
+            cached = id_ in getattr(cls, '.cache') or id_ in getattr(cls, '.trash')
+            cls._cache(id_, reset=False)
+            setattr(cls, '.query_generation', getattr(cls, '.query_generation') + 1)
+
+            if cls._ttl_policy is not None:
+                cls._ttl_policy.write(id_)
+
+            for key in list(getattr(cls, '.queries')):
+                cls._forget(key)
+
+        if refresh and cached:
+            logger.debug("Creating refresh %s(%s)", cls.__name__, id_)
+            refresh = cls._refresh(id_, ConcurrencyLimiter.BACKGROUND)
+            cls._refresh_tasks()[id_] = get_event_loop().create_task(refresh)
+
+    @staticmethod
+    def _matches(model: 'Supermodel', **kwargs) -> bool:
+        return True
+
+    @classmethod
+    def _postpone(cls, id_: Any, model: 'Supermodel'):
+        pending = getattr(cls, '.pending')
+
+        with getattr(cls, '.lock'):
+            pending[id_] = model
+
+            if cls._flush_size is not None and len(pending) >= cls._flush_size:
+                cls._flush_soon()
+            elif cls._flush_interval is not None and getattr(cls, '.flush_handle') is None:
+                cls._schedule_flush()
+
+    @classmethod
+    def _schedule_flush(cls):
+        logger.debug("Creating flush %s", cls.__name__)
+        loop = get_event_loop()
+        setattr(cls, '.flush_handle', (loop, loop.call_later(cls._flush_interval, cls._flush_soon)))
+
+    @classmethod
+    def _flush_soon(cls) -> Future:
+        task = get_event_loop().create_task(cls.flush())
+        task.add_done_callback(cls._flushed)
+        return task
+
+    @classmethod
+    def _shutdown_executor(cls, *_):
+        executor = vars(cls).get('.owned_executor')
+
+        if executor is not None:
+            setattr(cls, '.owned_executor', None)
+            setattr(cls, '.executor', None)
+            executor.shutdown(wait=False)
+
+    @classmethod
+    def _flushed(cls, task: Future):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Flushing %s failed: %r", cls.__name__, task.exception())
+
+    @classmethod
+    def _count(cls, name: str, value: int = 1):
+        getattr(cls, '.stats').count(name, value)
+        metrics = cls._metrics
+
+        if metrics is not None:
+            metrics.count(cls.__name__, name, value)
+
+    @classmethod
+    async def _backend(cls, hook: str, *args, priority_: int = ConcurrencyLimiter.INTERACTIVE, **kwargs) -> Any:
+        limiter = cls._concurrency
+
+        if limiter is not None:
+            await limiter.acquire(priority_)
+
+        start = perf_counter()
+
+        try:
+            return await cls._call(hook, *args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+
+            if limiter is not None:
+                limiter.release()
+
+            getattr(cls, '.stats').observe(hook, elapsed)
+            metrics = cls._metrics
+
+            if metrics is not None:
+                metrics.observe(cls.__name__, hook, elapsed)
+
+    @classmethod
+    async def _call(cls, hook: str, *args, **kwargs) -> Any:
+        func = getattr(cls, hook)
+
+        if iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+
+        result = await get_event_loop().run_in_executor(cls._executor, partial(func, *args, **kwargs))
+
+        if isawaitable(result):
+            result = await result
+
+        if hook == '_find' and not hasattr(result, '__aiter__'):
+            result = _ThreadIterator(result, cls._executor, cls._chunk_size)
+
+        return result
+
     @staticmethod
     async def _create(raw: dict):
         raise NotImplementedError
@@ -113,6 +853,18 @@ class Supermodel(Model, metaclass=SupermodelMeta):
     async def _get(id_: Any) -> Optional[dict]:
         raise NotImplementedError
 
+    @staticmethod
+    async def _get_many(ids: List[Any]) -> Dict[Any, Optional[dict]]:
+        raise NotImplementedError
+
+    @staticmethod
+    async def _get_if_changed(id_: Any, version: Any) -> Union[Optional[dict], NotModified]:
+        raise NotImplementedError
+
+    @classmethod
+    def _conditional(cls) -> bool:
+        return cls._version is not None and cls._get_if_changed is not Supermodel._get_if_changed
+
     @staticmethod
     async def _find(**kwargs) -> AsyncIterator[dict]:
         raise NotImplementedError
@@ -121,77 +873,501 @@ class Supermodel(Model, metaclass=SupermodelMeta):
     async def _update(id_: Any, raw: dict):
         raise NotImplementedError
 
+    @classmethod
+    async def _update_many(cls, raws: Dict[Any, dict]):
+        for id_, raw in raws.items():
+            await cls._call('_update', id_, raw)
+
+    @staticmethod
+    async def _update_if(id_: Any, expected_version: Any, changes: dict) -> Any:
+        raise NotImplementedError
+
+    @classmethod
+    def _optimistic(cls) -> bool:
+        return cls._version is not None and cls._update_if is not Supermodel._update_if and not cls._write_behind
+
     @staticmethod
     async def _delete(id_: Any):
         raise NotImplementedError
 
     @classmethod
     async def create(cls, *args, **kwargs):
-        model = cls(*args, **kwargs)
-        await cls._create(model.to_dict())
+        model = await offload(partial(cls, *args, **kwargs), (args, kwargs), cls._offload, cls._executor)
+        await cls._backend('_create', model.to_dict())
         cls._cache(model._id(), model)
+        cls._invalidate(model._id(), model)
+        session = Session.current()
+
+        if session is not None:
+            session.add(cls, model._id(), model)
+
         return model
 
+    @classmethod
+    async def acreate(cls, *args, **kwargs) -> 'Supermodel':
+        return await cls.create(*args, **kwargs)
+
     @classmethod
     async def get(cls, id_: Any, fresh: bool = False) -> Optional['Supermodel']:
-        cache = getattr(cls, '.cache')
+        session = Session.current()
+
+        if session is not None:
+            model = session.get(cls, id_)
+
+            if model is not None and not fresh:
+                return model
+
+        model = getattr(cls, '.cache').get(id_, UNSET)
+
+        if model is not UNSET:
+            cls._count('hit')
+
+            if cls._ttl_policy is not None:
+                cls._ttl_policy.read(id_)
+
+            return cls._identity(session, id_, model, fresh)
+
         trash = getattr(cls, '.trash')
-        refresh_tasks = getattr(cls, '.refresh_tasks')
+        refresh_tasks = cls._refresh_tasks()
+        logger.debug("%s(%s) miss", cls.__name__, id_)
+        cls._count('miss')
+
+        model = UNSET if fresh else trash.get(id_, UNSET)
 
-        if id_ in cache:
-            logger.debug("%s(%s) hit", cls.__name__, id_)
-            model = cache[id_]
+        if id_ not in refresh_tasks:
+            logger.debug("Creating refresh %s(%s)", cls.__name__, id_)
+            priority = ConcurrencyLimiter.INTERACTIVE if model is UNSET else ConcurrencyLimiter.BACKGROUND
+            refresh_tasks[id_] = get_event_loop().create_task(cls._refresh(id_, priority))
+        elif model is UNSET and cls._concurrency is not None:
+            cls._concurrency.promote(refresh_tasks[id_])
+
+        if model is not UNSET:
+            logger.debug("Getting %s(%s) out of trash", cls.__name__, id_)
+            cls._count('trash_hit')
         else:
-            logger.debug("%s(%s) miss", cls.__name__, id_)
+            logger.debug("Waiting for new %s(%s)", cls.__name__, id_)
+            model = await refresh_tasks[id_]
+
+        return cls._identity(session, id_, model, fresh)
+
+    @classmethod
+    async def get_many(cls, ids: Iterable[Any]) -> Dict[Any, Optional['Supermodel']]:
+        cache = getattr(cls, '.cache')
+        pending = getattr(cls, '.pending')
+        refresh_tasks = cls._refresh_tasks()
+        models = {}
+        waiting = {}
+        misses = []
+
+        for id_ in ids:
+            if id_ in models or id_ in waiting:
+                continue
+
+            model = cache.get(id_, UNSET)
 
-            if id_ not in refresh_tasks:
-                logger.debug("Creating refresh %s(%s)", cls.__name__, id_)
-                refresh_tasks[id_] = get_event_loop().create_task(cls._refresh(id_))
+            if model is not UNSET:
+                cls._count('hit')
+                models[id_] = model
 
-            if not fresh and id_ in trash:
-                logger.debug("Getting %s(%s) out of trash", cls.__name__, id_)
-                model = trash[id_]
+                if cls._ttl_policy is not None:
+                    cls._ttl_policy.read(id_)
+            elif id_ in pending:
+                logger.debug("%s(%s) pending", cls.__name__, id_)
+                models[id_] = pending[id_]
+                cls._cache(id_, models[id_])
+            elif id_ in refresh_tasks:
+                waiting[id_] = refresh_tasks[id_]
+
+                if cls._concurrency is not None:
+                    cls._concurrency.promote(waiting[id_])
             else:
-                logger.debug("Waiting for new %s(%s)", cls.__name__, id_)
-                model = await refresh_tasks[id_]
+                misses.append(id_)
 
-        return model
+        if misses and cls._get_many is not Supermodel._get_many:
+            cls._count('miss', len(misses))
+            raws = await cls._backend('_get_many', misses)
+
+            for id_ in misses:
+                raw = raws.get(id_)
+                model = await offload(partial(cls, **raw), raw, cls._offload, cls._executor) if raw else None
+                models[id_] = pending.get(id_, model)
+                cls._cache(id_, models[id_])
+        else:
+            for id_ in misses:
+                waiting[id_] = get_event_loop().create_task(cls.get(id_))
+
+        for id_, task in waiting.items():
+            models[id_] = await task
+
+        session = Session.current()
+
+        if session is not None:
+            models = {id_: session.add(cls, id_, m) for id_, m in models.items()}
+
+        return models
 
     @classmethod
-    async def find(cls, **kwargs) -> AsyncIterator['Supermodel']:
-        return SupermodelIterator(cls, await cls._find(**kwargs))
+    async def resolve(cls, models: Iterable['Supermodel'], attr: str) -> List[Any]:
+        values = [getattr(m, attr) for m in models]
+        ids = {}  # type: Dict[type, List[Any]]
 
-    async def update(self, **raw):
-        attributes = getattr(self, '.attributes')
-        id_ = self._id()
+        for value in values:
+            for ref in value if isinstance(value, (list, tuple)) else (value,):
+                if isinstance(ref, Ref):
+                    ids.setdefault(ref.target, []).append(ref.id)
+
+        resolved = dict(zip(ids, await gather(*(t.get_many(i) for t, i in ids.items()))))
+        result = []
+
+        for value in values:
+            if value is UNSET:
+                value = None
+            elif isinstance(value, Ref):
+                value = resolved[value.target][value.id]
+            elif isinstance(value, (list, tuple)):
+                value = type(value)(resolved[r.target][r.id] if isinstance(r, Ref) else r for r in value)
+
+            result.append(value)
+
+        return result
+
+    @classmethod
+    def peek(cls, id_: Any, stale: bool = True) -> Optional['Supermodel']:
+        model = getattr(cls, '.cache').get(id_, UNSET)
+
+        if model is not UNSET:
+            cls._count('hit')
+            return model
+
+        if stale:
+            model = getattr(cls, '.trash').get(id_, UNSET)
+
+            if model is not UNSET:
+                cls._count('trash_hit')
+                return model
+
+        return None
+
+    get_cached = peek
+
+    @classmethod
+    def _find_cached(cls, **kwargs) -> List['Supermodel']:
+        attributes = getattr(cls, '.attributes')
+        cache = getattr(cls, '.cache')
+        indexes = getattr(cls, '.indexes')
+        ids = None
+        filters = []
+
+        for key, value in kwargs.items():
+            attr = next((a for a in attributes if (a.ciname or a.name) == key), None)
+
+            if attr is None:
+                raise TypeError("Invalid {}.find: unknown attribute {}".format(cls.__name__, key))
+
+            if isinstance(value, slice):
+                value = slice(
+                    None if value.start is None else validate(attr.type, value.start, attr.strict),
+                    None if value.stop is None else validate(attr.type, value.stop, attr.strict),
+                )
+            else:
+                value = validate(attr.type, value, attr.strict)
+
+            if attr.name in indexes:
+                index = indexes[attr.name]
+
+                if isinstance(value, slice):
+                    found = index.range(value.start, value.stop)
+                else:
+                    found = index.get(value)
+
+                if ids is None:
+                    ids = list(found)
+                else:
+                    known = set(ids)
+                    ids = [i for i in found if i in known]
+            else:
+                filters.append((attr.name, value))
+
+        logger.debug("Finding %s(%s) in cache", cls.__name__, kwargs)
+        models = (cache.get(i) for i in ids) if ids is not None else cache.values()
+
+        return [m for m in models if m is not None and all(_match(getattr(m, n), v) for n, v in filters)]
+
+    @classmethod
+    async def find(cls, *, cached_: bool = False, **kwargs) -> AsyncIterator['Supermodel']:
+        if cached_:
+            return SupermodelIterator(cls, _ListIterator(cls._find_cached(**kwargs)))
+
+        query = None
+
+        if cls._find_ttl is not None:
+            key = _freeze(kwargs)
+
+            try:
+                hash(key)
+            except TypeError:
+                pass
+            else:
+                queries = getattr(cls, '.queries')
+
+                if key in queries:
+                    logger.debug("%s(%s) query hit", cls.__name__, kwargs)
+                    cls._count('query_hit')
+                    return SupermodelIterator(cls, _IdsIterator(cls, queries[key][1]), prefetch=cls._prefetch)
+
+                logger.debug("%s(%s) query miss", cls.__name__, kwargs)
+                cls._count('query_miss')
+                query = (key, kwargs, getattr(cls, '.query_generation'))
+
+        return SupermodelIterator(cls, await cls._backend('_find', **kwargs), query, cls._prefetch)
+
+    def _patch(self, raw: Dict[str, Any]) -> Tuple['Supermodel', List[str]]:
         new = copy(self)
+        changed = []
 
-        for attr in attributes:
+        for attr in getattr(self, '.attributes'):
             name = attr.ciname or attr.name
             value = next((v for k, v in raw.items() if name == k), None)
 
             if value:
                 setattr(new, attr.name, value)
+                changed.append(attr.name)
 
-        await self._update(id_, new.to_dict())
+        return new, changed
+
+    async def update(self, *, retries_: int = 3, **raw):
+        cls = type(self)
+        attributes = getattr(self, '.attributes')
+        id_ = self._id()
+        new, changed = await offload(partial(self._patch, raw), raw, cls._offload, cls._executor)
+        version = UNSET
+        session = None if cls._optimistic() or cls._write_behind else Session.current()
+
+        if cls._optimistic():
+            changes = {n: self._to_dict(getattr(new, n)) for n in changed}
+
+            for attempt in range(retries_ + 1):
+                expected = getattr(self, cls._version)
+                version = await self._backend('_update_if', id_, expected, changes)
+
+                if version is not None:
+                    break
+
+                logger.debug("%s(%s) conflicts with version %r", cls.__name__, id_, expected)
+                cls._count('conflict')
+                fresh = await cls._refresh(id_, cache=False) if attempt < retries_ else None
+
+                if fresh is None:
+                    raise ModelConflictError(model=cls.__name__, version=expected)
+
+                for attr in attributes:
+                    setattr(self, attr.name, getattr(fresh, attr.name))
+        elif not cls._write_behind and session is None:
+            await self._backend('_update', id_, new.to_dict())
 
         for attr in attributes:
-            name = attr.ciname or attr.name
-            value = next((v for k, v in raw.items() if name == k), None)
+            if attr.name in changed:
+                setattr(self, attr.private_name, getattr(new, attr.private_name))
 
-            if value:
-                setattr(self, attr.name, value)
+        if version is not UNSET:
+            setattr(self, cls._version, version)
+
+        if cls._ttl_policy is not None:
+            cls._ttl_policy.write(id_)
 
         self._cache(id_, self)
+        self._invalidate(id_, self, publish=session is None and not cls._write_behind)
+
+        if type(self)._write_behind:
+            self._postpone(id_, self)
+
+        if session is not None:
+            session.mark(cls, id_, self)
 
     async def delete(self):
         id_ = self._id()
-        await self._delete(id_)
+        getattr(self, '.pending').pop(id_, None)
+        session = Session.current()
+
+        if session is not None:
+            session.discard(type(self), id_)
+
+        await self._backend('_delete', id_)
         self._cache(id_, reset=False)
 
+        if type(self)._ttl_policy is not None:
+            type(self)._ttl_policy.forget(id_)
+
+        self._invalidate(id_)
+
     @classmethod
-    def close(cls):
-        for tasks in (getattr(cls, '.expire_handles'), getattr(cls, '.refresh_tasks')):
-            while tasks:
-                id_ = next(iter(tasks))
-                tasks.pop(id_).cancel()
+    async def flush(cls):
+        pending = getattr(cls, '.pending')
+
+        with getattr(cls, '.lock'):
+            flush_handle = getattr(cls, '.flush_handle')
+
+            if flush_handle is not None:
+                _cancel(flush_handle)
+                setattr(cls, '.flush_handle', None)
+
+            if not pending:
+                return
+
+            models = dict(pending)
+            pending.clear()
+
+        logger.debug("Flushing %s %s", len(models), cls.__name__)
+
+        try:
+            await cls._backend('_update_many', {id_: model.to_dict() for id_, model in models.items()})
+        except BaseException:
+            with getattr(cls, '.lock'):
+                for id_, model in models.items():
+                    pending.setdefault(id_, model)
+
+                if cls._flush_interval is not None and getattr(cls, '.flush_handle') is None:
+                    cls._schedule_flush()
+
+            raise
+
+        for id_ in models:
+            cls._publish(id_)
+
+    @staticmethod
+    def session(concurrent: bool = False) -> Session:
+        return Session(concurrent)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        stats = getattr(cls, '.stats').to_dict()
+        stats['gauges'] = {
+            'cache_size': len(getattr(cls, '.cache')),
+            'trash_size': len(getattr(cls, '.trash')),
+            'refreshes': sum(len(t) for t in list(getattr(cls, '.refresh_tasks').values())),
+            'pending': len(getattr(cls, '.pending')),
+            'queue_depth': cls._concurrency.depth if cls._concurrency is not None else 0,
+        }
+        return stats
+
+    @classmethod
+    def report(cls) -> Dict[str, Any]:
+        stats = cls.stats()
+        metrics = cls._metrics
+
+        if metrics is not None:
+            for name, value in stats['gauges'].items():
+                metrics.gauge(cls.__name__, name, value)
+
+        return stats
+
+    @classmethod
+    def snapshot(cls, path: str) -> int:
+        cache = getattr(cls, '.cache')
+        trash = getattr(cls, '.trash')
+        expire_handles = getattr(cls, '.expire_handles')
+        now = time()
+        entries = []
+
+        for id_, model in list(cache.items()):
+            scheduled = expire_handles.get(id_)
+
+            if scheduled is None:
+                entries.append((id_, model, None))
+            else:
+                loop, handle = scheduled
+                entries.append((id_, model, now + handle.when() - loop.time()))
+
+        entries.extend((id_, model, 0) for id_, model in list(trash.items()) if id_ not in cache)
+        tmp = '{}.{}.tmp'.format(path, getpid())
+
+        with open(tmp, 'wb') as f:
+            dump(entries, f, HIGHEST_PROTOCOL)
+
+        replace(tmp, path)
+        logger.debug("Snapshot %s %s to %s", len(entries), cls.__name__, path)
+        return len(entries)
+
+    @classmethod
+    def warm(cls, path: str) -> int:
+        cache = getattr(cls, '.cache')
+        trash = getattr(cls, '.trash')
+        count = 0
+
+        with open(path, 'rb') as f:
+            entries = load(f)
+
+        now = time()
+
+        for id_, model, expires in entries:
+            if id_ in cache:
+                continue
+
+            ttl = None if expires is None else expires - now
+
+            if ttl is None or ttl > 0:
+                cls._cache(id_, model, ttl=ttl)
+            elif id_ not in trash:
+                trash.set(id_, model)
+            else:
+                continue
+
+            count += 1
+
+        logger.debug("Warmed %s %s from %s", count, cls.__name__, path)
+        return count
+
+    @classmethod
+    async def warm_from_find(cls, prefetch_: int = 100, **query) -> int:
+        count = 0
+
+        async for _ in SupermodelIterator(cls, await cls._backend('_find', **query), prefetch=prefetch_):
+            count += 1
+
+        logger.debug("Warmed %s %s from find(%s)", count, cls.__name__, query)
+        return count
+
+    @classmethod
+    def close(cls) -> Optional[Future]:
+        refresh_tasks = getattr(cls, '.refresh_tasks')
+
+        with getattr(cls, '.lock'):
+            for handles in (getattr(cls, '.expire_handles'), getattr(cls, '.query_handles')):
+                while handles:
+                    key = next(iter(handles))
+                    _cancel(handles.pop(key))
+
+            for loop, tasks in list(refresh_tasks.items()):
+                while tasks:
+                    id_ = next(iter(tasks))
+                    _cancel((loop, tasks.pop(id_)))
+
+            refresh_tasks.clear()
+            getattr(cls, '.queries').clear()
+
+            pending = getattr(cls, '.pending')
+
+            if pending:
+                try:
+                    loop = get_event_loop()
+                except RuntimeError:
+                    loop = None
+
+                if loop is not None and loop.is_running():
+                    task = cls._flush_soon()
+                    task.add_done_callback(cls._shutdown_executor)
+                    return task
+
+                if loop is None or loop.is_closed():
+                    logger.warning("Closing %s with %s unflushed writes", cls.__name__, len(pending))
+
+            flush_handle = getattr(cls, '.flush_handle')
+
+            if flush_handle is not None:
+                _cancel(flush_handle)
+                setattr(cls, '.flush_handle', None)
+
+        if pending and loop is not None and not loop.is_closed():
+            loop.run_until_complete(cls.flush())
+
+        cls._shutdown_executor()
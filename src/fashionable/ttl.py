@@ -0,0 +1,65 @@
+from collections import OrderedDict
+from typing import Any, List, Optional, Union
+
+__all__ = [
+    'AdaptiveTTL',
+]
+
+Number = Union[int, float]
+
+
+class AdaptiveTTL:
+    # noinspection PyShadowingBuiltins
+    def __init__(self, min: Number, max: Number, *, factor: Number = 2, reads: int = 10, maxsize: int = 10000):
+        if not 0 < min <= max:
+            raise ValueError("Invalid {}: must be 0 < min <= max".format(type(self).__name__))
+
+        if factor <= 1:
+            raise ValueError("Invalid {}.factor: must be > 1".format(type(self).__name__))
+
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("Invalid {}.maxsize: must be positive int".format(type(self).__name__))
+
+        self.min = min
+        self.max = max
+        self.factor = factor
+        self.reads = reads
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # type: OrderedDict[Any, List[Number]]
+
+    def read(self, id_: Any):
+        entry = self._entries.get(id_)
+
+        if entry is not None:
+            entry[1] += 1
+
+    def write(self, id_: Any):
+        entry = self._entries.get(id_)
+
+        if entry is not None:
+            entry[2] += 1
+
+    def forget(self, id_: Any):
+        self._entries.pop(id_, None)
+
+    def ttl(self, id_: Any, base: Optional[Number] = None) -> Number:
+        entry = self._entries.get(id_)
+
+        if entry is None:
+            ttl = base or self.min
+        else:
+            ttl, reads, writes = entry
+
+            if writes:
+                ttl /= self.factor
+            elif reads >= self.reads:
+                ttl *= self.factor
+
+        ttl = min(max(ttl, self.min), self.max)
+        self._entries[id_] = [ttl, 0, 0]
+        self._entries.move_to_end(id_)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+        return ttl
@@ -1,13 +1,17 @@
-from functools import lru_cache
+from asyncio import get_event_loop
+from concurrent.futures import Executor
+from functools import lru_cache, partial
 from itertools import chain, product, repeat
 from logging import getLogger
-from typing import Any, Dict, Iterable, List, Mapping, Set, Tuple, Type, Union
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Type, Union
 
 from .errors import ValidateError
 from .typedef import Typing
 from .unset import UNSET
 
 __all__ = [
+    'avalidate',
+    'offload',
     'validate',
 ]
 
@@ -128,3 +132,53 @@ def validate(typ: Typing, value: Any, strict: bool = False) -> Any:
         err = TypeError("must be {}, not {}".format(typ, type(value)))
         logger.debug("%s(%s, %s, %s): %s", validate.__name__, typ, value, strict, exc)
         raise err from exc
+
+
+def _estimate(value: Any, limit: int) -> int:
+    size = 0
+    stack = [value]
+
+    while stack and size <= limit:
+        value = stack.pop()
+
+        if isinstance(value, (str, bytes, bytearray)):
+            size += len(value)
+        elif isinstance(value, Mapping):
+            size += len(value)
+
+            if size <= limit:
+                stack.extend(value.keys())
+                stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            size += len(value)
+
+            if size <= limit:
+                stack.extend(value)
+        else:
+            size += 1
+
+    return size
+
+
+async def offload(
+        func: Callable[[], Any],
+        payload: Any,
+        threshold: Optional[int] = 1 << 16,
+        executor: Optional[Executor] = None
+) -> Any:
+    if threshold is None or _estimate(payload, threshold) <= threshold:
+        return func()
+
+    logger.debug("Offloading %s", func)
+    return await get_event_loop().run_in_executor(executor, func)
+
+
+async def avalidate(
+        typ: Typing,
+        value: Any,
+        strict: bool = False,
+        *,
+        threshold: Optional[int] = 1 << 16,
+        executor: Optional[Executor] = None
+) -> Any:
+    return await offload(partial(validate, typ, value, strict), value, threshold, executor)
@@ -43,6 +43,7 @@ def test_without_parameters():
     assert a.min is UNSET
     assert a.max is UNSET
     assert a.case_insensitive is True
+    assert a.index is False
 
 
 def test_type():
@@ -134,3 +135,11 @@ def test_eq():
     assert hash(a1) != hash(b)
     # noinspection PyTypeChecker
     assert a1.__eq__('a') is NotImplemented
+
+
+def test_index():
+    assert Attribute(str, index=True).index is True
+
+    with raises(TypeError):
+        # noinspection PyTypeChecker
+        Attribute(str, index=1)
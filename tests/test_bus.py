@@ -0,0 +1,315 @@
+from asyncio import new_event_loop, sleep
+from pickle import dumps
+from threading import Thread
+from uuid import UUID
+from typing import Optional
+
+from pytest import mark, raises
+
+from fashionable import Attribute, Bus, LocalBroker, LocalTransport, Supermodel, UnixTransport
+
+
+def make(bus: Bus, name: Optional[str] = None) -> type:
+    gets = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _bus = bus
+
+        a = Attribute(str)
+        b = Attribute(int)
+
+        @staticmethod
+        async def _create(raw: dict):
+            pass
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            gets.append(id_)
+            return {'a': id_, 'b': len(gets)}
+
+        @staticmethod
+        async def _update(id_: str, raw: dict):
+            pass
+
+        @staticmethod
+        async def _delete(id_: str):
+            pass
+
+    S.gets = gets
+
+    if name is not None:
+        bus.register(S, name)
+
+    return S
+
+
+async def check(bus1: Bus, bus2: Bus):
+    S1 = make(bus1, 'S')
+    S2 = make(bus2, 'S')
+    bus1.open()
+    bus2.open()
+
+    s = await S2.get('x')
+    await S2.get('y')
+    assert S2.gets == ['x', 'y']
+
+    await (await S1.get('x')).update(b=10)
+    await (await S1.get('y')).update(b=20)
+    await sleep(0.05)
+
+    assert not getattr(S2, '.cache')
+    assert (await S2.get('x')) is not s
+    assert S2.gets == ['x', 'y', 'x']
+
+    bus1.close()
+    bus2.close()
+    S1.close()
+    S2.close()
+
+
+@mark.asyncio
+async def test_local_bus():
+    broker = LocalBroker()
+    await check(Bus(LocalTransport(broker)), Bus(LocalTransport(broker)))
+    assert not broker.transports
+
+
+@mark.asyncio
+async def test_unix_bus(tmp_path):
+    await check(Bus(UnixTransport(str(tmp_path))), Bus(UnixTransport(str(tmp_path))))
+    assert not list(tmp_path.iterdir())
+
+
+@mark.asyncio
+async def test_bus_refresh():
+    broker = LocalBroker()
+    bus1 = Bus(LocalTransport(broker), delay=0)
+    bus2 = Bus(LocalTransport(broker), delay=0, refresh=True)
+    S1 = make(bus1, 'S')
+    S2 = make(bus2, 'S')
+    bus1.open()
+    bus2.open()
+
+    await S2.get('x')
+    await (await S1.create('x', 0)).delete()
+    await sleep(0.01)
+    assert S2.gets == ['x', 'x']
+    assert 'x' in getattr(S2, '.cache')
+
+    bus1.close()
+    bus2.close()
+
+
+@mark.asyncio
+async def test_bus_session():
+    broker = LocalBroker()
+    bus1 = Bus(LocalTransport(broker), delay=0)
+    bus2 = Bus(LocalTransport(broker), delay=0)
+    S1 = make(bus1, 'S')
+    S2 = make(bus2, 'S')
+    bus1.open()
+    bus2.open()
+
+    @classmethod
+    async def _update_many(cls, raws: dict):
+        await sleep(0.01)
+        assert 'x' in getattr(S2, '.cache')
+
+    S1._update_many = _update_many
+    await S2.get('x')
+
+    async with S1.session():
+        await (await S1.get('x')).update(b=10)
+        await sleep(0.01)
+        assert 'x' in getattr(S2, '.cache')
+
+    await sleep(0.01)
+    assert 'x' not in getattr(S2, '.cache')
+
+    bus1.close()
+    bus2.close()
+    S1.close()
+    S2.close()
+
+
+@mark.asyncio
+async def test_bus_write_behind():
+    db = {'x': {'a': 'x', 'b': 0}}
+    broker = LocalBroker()
+    bus1 = Bus(LocalTransport(broker), delay=0)
+    bus2 = Bus(LocalTransport(broker), delay=0, refresh=True)
+
+    def make_db(bus: Bus, **options) -> type:
+        # noinspection PyAbstractClass
+        class S(Supermodel):
+            _bus = bus
+            _ttl = 60
+
+            a = Attribute(str)
+            b = Attribute(int)
+
+            @staticmethod
+            async def _get(id_: str) -> Optional[dict]:
+                return dict(db[id_])
+
+            @classmethod
+            async def _update_many(cls, raws: dict):
+                db.update(raws)
+
+        for key, value in options.items():
+            setattr(S, key, value)
+
+        bus.register(S, 'S')
+        return S
+
+    S1 = make_db(bus1, _flush_interval=0.02)
+    S2 = make_db(bus2)
+    bus1.open()
+    bus2.open()
+
+    await S2.get('x')
+    await (await S1.get('x')).update(b=5)
+    await sleep(0.01)
+    assert (await S2.get('x')).b == 0
+
+    await sleep(0.03)
+    assert db['x']['b'] == 5
+    assert (await S2.get('x')).b == 5
+
+    bus1.close()
+    bus2.close()
+    S1.close()
+    S2.close()
+
+
+@mark.asyncio
+async def test_bus_allowed():
+    evicted = []
+
+    class S:
+        @staticmethod
+        def _evict(id_, refresh):
+            evicted.append(id_)
+
+    uuid = UUID(int=1)
+    bus = Bus(LocalTransport(LocalBroker()))
+    bus.register(S, 'S')
+    bus._receive(dumps({'S': [uuid]}))
+    bus._receive(b'garbage')
+    bus._receive(dumps(['S']))
+    assert evicted == []
+
+    bus = Bus(LocalTransport(LocalBroker()), allowed=[('uuid', 'UUID'), ('uuid', 'SafeUUID')])
+    bus.register(S, 'S')
+    bus._receive(dumps({'S': ['x', (1, 2), uuid]}))
+    assert evicted == ['x', (1, 2), uuid]
+
+
+@mark.asyncio
+async def test_bus_threads():
+    broker = LocalBroker()
+    bus1 = Bus(LocalTransport(broker), delay=0.01)
+    bus2 = Bus(LocalTransport(broker), delay=0)
+    S1 = make(bus1, 'S')
+    S2 = make(bus2, 'S')
+    bus1.open()
+    bus2.open()
+    await S2.get('x')
+
+    async def publish():
+        # noinspection PyProtectedMember
+        S1._publish('x')
+
+    def run():
+        loop = new_event_loop()
+
+        try:
+            loop.run_until_complete(publish())
+        finally:
+            loop.close()
+
+    thread = Thread(target=run)
+    thread.start()
+    thread.join()
+    assert bus1.scheduled
+    await sleep(0.03)
+    assert not bus1.scheduled
+    assert 'x' not in getattr(S2, '.cache')
+
+    bus1.close()
+    bus2.close()
+    S1.close()
+    S2.close()
+
+
+@mark.asyncio
+async def test_unix_bus_burst(tmp_path):
+    evicted = []
+
+    class S:
+        @staticmethod
+        def _evict(id_, refresh):
+            evicted.append(id_)
+
+    bus1 = Bus(UnixTransport(str(tmp_path), buffer_size=1 << 12), delay=0)
+    bus2 = Bus(UnixTransport(str(tmp_path), buffer_size=1 << 12), delay=0)
+    bus1.register(S, 'S')
+    bus2.register(S, 'S')
+    bus1.open()
+    bus2.open()
+
+    ids = ['id-{}'.format(i) for i in range(5000)]
+
+    for id_ in ids:
+        bus1.publish(S, id_)
+
+    bus1.flush()
+    await sleep(0.05)
+    assert sorted(evicted) == sorted(ids)
+
+    bus1.close()
+    bus2.close()
+
+
+@mark.asyncio
+async def test_bus_oversized_id(tmp_path):
+    bus1 = Bus(UnixTransport(str(tmp_path), buffer_size=64), delay=0)
+    bus2 = Bus(UnixTransport(str(tmp_path), buffer_size=64), delay=0)
+    S1 = make(bus1, 'S')
+    S2 = make(bus2, 'S')
+    bus1.open()
+    bus2.open()
+
+    await S2.get('x')
+    await S2.get('y')
+    # noinspection PyProtectedMember
+    S1._publish('z' * 100)
+    bus1.flush()
+    await sleep(0.01)
+    assert not getattr(S2, '.cache')
+
+    bus1.close()
+    bus2.close()
+    S1.close()
+    S2.close()
+
+
+def test_bus_option():
+    bus = Bus(LocalTransport(LocalBroker()))
+
+    # noinspection PyAbstractClass
+    class S1(Supermodel):
+        _bus = bus
+
+    # noinspection PyAbstractClass
+    class S2(S1):
+        pass
+
+    assert S2._bus is bus
+    assert set(bus.models.values()) == {S1, S2}
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S(Supermodel):
+            _bus = 'bus'
@@ -0,0 +1,192 @@
+from fnmatch import fnmatch
+from pickle import dumps, loads
+from asyncio import sleep as async_sleep
+from time import sleep, time
+from typing import Optional
+
+from pytest import fixture, mark
+
+from fashionable import Attribute, KeyValueCache, MemoryCache, Model, SharedCache, Supermodel
+
+
+class M(Model):
+    a = Attribute(str)
+    b = Attribute(Optional[int])
+
+
+class KeyValueStandIn:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.data.get(key)
+
+    def set(self, key: str, value: bytes, px: Optional[int] = None):
+        self.data[key] = value
+
+    def delete(self, key: str) -> int:
+        return int(self.data.pop(key, None) is not None)
+
+    def scan_iter(self, match: str):
+        return [k.encode() for k in self.data if fnmatch(k, match)]
+
+
+@fixture(params=['memory', 'shared', 'key_value'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return lambda name: MemoryCache(name)
+    elif request.param == 'shared':
+        path = str(tmp_path / 'cache.db')
+        return lambda name: SharedCache(path, name)
+    else:
+        client = KeyValueStandIn()
+        return lambda name: KeyValueCache(client, name)
+
+
+def test_model_pickle():
+    m = M('x', 5)
+    restored = loads(dumps(m))
+    assert type(restored) is M
+    assert restored == m
+    assert restored.b == 5
+
+
+def test_backend(backend):
+    cache = backend('c')
+    other = backend('o')
+
+    cache.set('x', M('x', 1))
+    cache['y'] = M('y')
+    other.set('x', None)
+
+    assert 'x' in cache
+    assert 'z' not in cache
+    assert cache['x'] == M('x', 1)
+    assert cache.get('z') is None
+    assert len(cache) == 2
+    assert sorted(cache) == ['x', 'y']
+    assert other['x'] is None
+
+    assert cache.pop('y') == M('y')
+    assert cache.pop('y', None) is None
+    del cache['x']
+    assert len(cache) == 0
+    assert len(other) == 1
+
+
+def test_backend_ttl(backend):
+    cache = backend('c')
+    cache.set('x', M('x'), 0.01)
+    cache.set('y', M('y'))
+    sleep(0.02)
+
+    if isinstance(cache, MemoryCache):
+        assert 'x' in cache
+        assert cache.expires('x') is None
+    else:
+        assert 'x' not in cache
+        assert cache.expires('x') < time()
+        assert cache.expires('y') is None
+        assert sorted(cache) == ['y']
+        assert cache.pop('x') == M('x')
+
+
+class S(Supermodel):
+    a = Attribute(str)
+    b = Attribute(int)
+
+    @staticmethod
+    async def _create(raw: dict):
+        pass
+
+    @staticmethod
+    async def _get(id_: str) -> Optional[dict]:
+        pass
+
+
+def test_cache_backend():
+    names = []
+
+    # noinspection PyAbstractClass
+    class S1(Supermodel):
+        _cache_backend = lambda name: names.append(name) or MemoryCache(name)  # noqa: E731
+
+    # noinspection PyAbstractClass
+    class S2(S1):
+        pass
+
+    assert isinstance(getattr(S, '.cache'), MemoryCache)
+    assert [n.rsplit('.', 2)[-2:] for n in names] == [
+        ['S1', 'cache'], ['S1', 'trash'], ['S2', 'cache'], ['S2', 'trash'],
+    ]
+
+
+@mark.asyncio
+async def test_shared_supermodel(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    name = getattr(S, '.cache').name
+    setattr(S, '.cache', SharedCache(path, name))
+    peer = SharedCache(path, name)
+
+    s1 = await S.create('s1', 1)
+    assert peer['s1'] == s1
+    assert peer['s1'] is not s1
+
+    peer.set('s2', S('s2', 2))
+    assert await S.get('s2') == S('s2', 2)
+
+
+
+client = KeyValueStandIn()
+
+
+class Indexed(Supermodel):
+    _cache_backend = lambda name: KeyValueCache(client, name)  # noqa: E731
+
+    a = Attribute(str)
+    b = Attribute(int, index=True)
+
+    @staticmethod
+    async def _create(raw: dict):
+        pass
+
+
+@mark.asyncio
+async def test_shared_index():
+    peer = KeyValueCache(client, getattr(Indexed, '.cache').name)
+    await Indexed.create('i1', 1)
+    peer.set('i2', Indexed('i2', 2))
+    found = []
+
+    async for model in await Indexed.find(cached_=True, b=2):
+        found.append(model.a)
+
+    assert found == ['i2']
+    assert not getattr(Indexed, '.indexes')
+    Indexed.close()
+
+
+class Expiring(Supermodel):
+    _cache_backend = lambda name: KeyValueCache(client, name)  # noqa: E731
+    _ttl = 0.02
+
+    a = Attribute(str)
+
+    @staticmethod
+    async def _create(raw: dict):
+        pass
+
+
+@mark.asyncio
+async def test_shared_expire():
+    peer = KeyValueCache(client, getattr(Expiring, '.cache').name)
+    await Expiring.create('e1')
+    await async_sleep(0.01)
+    peer.set('e1', Expiring('e1'), 0.03)
+    await async_sleep(0.02)
+    assert 'e1' in peer
+    assert 'e1' not in getattr(Expiring, '.trash')
+    await async_sleep(0.03)
+    assert 'e1' not in peer
+    assert 'e1' in getattr(Expiring, '.trash')
+    Expiring.close()
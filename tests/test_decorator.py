@@ -1,11 +1,16 @@
 import datetime
 import decimal
 import pathlib
-from typing import Dict, Optional, Set, Tuple
+from asyncio import gather, sleep
+from time import sleep as sleep_sync
+from typing import AsyncIterator, Dict, Generator, Iterator, List, Optional, Set, Tuple
 
 from pytest import mark, raises
 
-from fashionable import Attribute, InvalidArgError, MissingArgError, Model, RetError, fashionable
+from fashionable import (
+    Attribute, InvalidArgError, Memo, MetricsSink, MissingArgError, Model, Profile, RetError, UNSET, ValidationPolicy,
+    fashionable,
+)
 
 
 def test_no_parenthesis():
@@ -292,3 +297,424 @@ def test_no_case_insensitivity():
 
     with raises(MissingArgError):
         no_case_insensitivity(**{'first_param': 3, 'SECOND-PARAM': 'b'})
+
+
+def test_binder():
+    @fashionable
+    def binder(first_arg: int, *args: int, second_arg: str = 'b', **kwargs: int):
+        return first_arg, args, second_arg, kwargs
+
+    assert binder('1', '2', '3') == (1, (2, 3), 'b', {})
+    assert binder(firstArg='1', SecondArg=2) == (1, (), '2', {})
+    assert binder(1, 2, first_arg=3) == (3, (1, 2), 'b', {})
+    assert binder(1, **{'second-arg': 'c', 'other': '4'}) == (1, (), 'c', {'other': 4})
+    assert binder(**{'first-arg': 1}) == (1, (), 'b', {})
+    assert binder(**{'first-arg': 2}) == (2, (), 'b', {})
+
+    with raises(InvalidArgError):
+        binder('x')
+
+    with raises(MissingArgError):
+        binder()
+
+
+def test_cache():
+    calls = []
+
+    @fashionable(cache_=2)
+    def square(x: int) -> int:
+        calls.append(x)
+        return x * x
+
+    assert square(2) == 4
+    assert square('2') == 4
+    assert square(x=2.0) == 4
+    assert calls == [2]
+    assert square(3) == 9
+    assert square(2) == 4
+    assert square(4) == 16
+    assert square(3) == 9
+    assert calls == [2, 3, 4, 3]
+    assert square.cache.stats() == {'hit': 3, 'miss': 4, 'evict': 2, 'size': 2}
+
+    @fashionable(cache_=Memo(ttl=0.01))
+    def ident(x: list):
+        calls.append(x)
+        return x
+
+    calls.clear()
+    assert ident([1]) == [1]
+    assert ident([1]) == [1]
+    assert calls == [[1]]
+    sleep_sync(0.02)
+    assert ident([1]) == [1]
+    assert calls == [[1], [1]]
+
+    with raises(TypeError):
+        fashionable(cache_='1')(square.func)
+
+    with raises(ValueError):
+        Memo(eviction='random')
+
+
+def test_cache_lfu():
+    memo = Memo(2, eviction='lfu')
+    memo.set('a', 1)
+    memo.set('b', 2)
+    assert memo.get('a') == 1
+    memo.set('c', 3)
+    assert memo.get('b') is UNSET
+    assert memo.get('a') == 1
+    assert len(memo) == 2
+
+
+@mark.asyncio
+async def test_cache_async():
+    calls = []
+
+    @fashionable(cache_=True)
+    async def slow(x: int) -> str:
+        calls.append(x)
+        await sleep(0.01)
+        return x
+
+    assert await gather(slow(1), slow('1'), slow(1.0), slow(2)) == ['1', '1', '1', '2']
+    assert await slow(1) == '1'
+    assert calls == [1, 2]
+    assert slow.cache.stats()['coalesce'] == 2
+
+    @fashionable(cache_=True)
+    async def fail(x: int):
+        calls.append(x)
+        raise ValueError
+
+    calls.clear()
+
+    for _ in range(2):
+        with raises(ValueError):
+            await fail(1)
+
+    assert calls == [1, 1]
+
+    async def body(x: int) -> str:
+        calls.append(x)
+        await sleep(0.01)
+        return x
+
+    @fashionable(cache_=True)
+    def wrapped(x: int) -> str:
+        return body(x)
+
+    calls.clear()
+    assert await wrapped(1) == '1'
+    assert await gather(wrapped(1), wrapped(2), wrapped('2')) == ['1', '2', '2']
+    assert calls == [1, 2]
+
+
+def test_cache_generator():
+    @fashionable(cache_=True)
+    def count(n: int) -> Iterator[int]:
+        for i in range(n):
+            yield i
+
+    assert list(count(3)) == [0, 1, 2]
+    assert list(count(3)) == [0, 1, 2]
+    assert count.cache.stats()['bypass'] == 2
+    assert len(count.cache) == 0
+
+
+def test_policy():
+    @fashionable(policy_=ValidationPolicy('sample', 3))
+    def sampled(x: int) -> int:
+        return x
+
+    assert [sampled('1') for _ in range(4)] == [1, '1', '1', 1]
+    assert sampled.policy.stats() == {'validate': 2, 'skip': 2}
+
+    @fashionable(policy_=ValidationPolicy('first', 2))
+    def first(x: int, y: List[int] = ()):
+        return x, y
+
+    assert first('1') == (1, ())
+    assert first('2') == (2, ())
+    assert first('3') == ('3', ())
+    assert first(4, y=['5']) == (4, [5])
+    assert first.policy.stats() == {'validate': 3, 'skip': 1}
+
+    @fashionable(policy_=ValidationPolicy('coerce'))
+    def coerced(x: int, y: List[int]) -> str:
+        return x, y
+
+    assert coerced('1', ('2',)) == "(1, ('2',))"
+
+    with raises(InvalidArgError):
+        coerced('x', [])
+
+    with raises(ValueError):
+        ValidationPolicy('never')
+
+    with raises(TypeError):
+        fashionable(policy_='sample')(coerced.func)
+
+
+def test_default_policy():
+    @fashionable
+    def f(x: int):
+        return x
+
+    ValidationPolicy.default = ValidationPolicy('sample', 2)
+
+    try:
+        assert [f('1'), f('1')] == [1, '1']
+    finally:
+        ValidationPolicy.default = None
+
+    assert f('1') == 1
+
+
+def test_generator():
+    @fashionable
+    def rows(n: int) -> Iterator[int]:
+        for i in range(n):
+            received = yield str(i)
+
+            if received is not None:
+                yield received
+
+    assert list(rows('3')) == [0, 1, 2]
+
+    gen = rows(2)
+    assert next(gen) == 0
+    assert gen.send('5') == 5
+    assert next(gen) == 1
+    gen.close()
+
+    @fashionable
+    def plain(x):
+        yield x
+
+    assert list(plain(1)) == [1]
+
+    @fashionable
+    def bad() -> Generator[int, None, None]:
+        yield 1
+        yield 'x'
+
+    gen = bad()
+    assert next(gen) == 1
+
+    with raises(RetError):
+        next(gen)
+
+
+@mark.asyncio
+async def test_async_iterator():
+    class Numbers:
+        def __init__(self, n: int):
+            self.items = iter(range(n))
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            for i in self.items:
+                return str(i)
+
+            raise StopAsyncIteration
+
+    @fashionable
+    def numbers(n: int) -> AsyncIterator[int]:
+        return Numbers(n)
+
+    items = []
+
+    async for i in numbers(3):
+        items.append(i)
+
+    assert items == [0, 1, 2]
+
+
+def test_map():
+    @fashionable
+    def add(x: int, y: int = 0) -> int:
+        return x + y
+
+    assert add.map(['1', ('2', '3'), {'x': 4, 'Y': '5'}]) == [1, 5, 9]
+
+    with raises(InvalidArgError):
+        add.map([1, 'x'])
+
+    results = add.map([1, 'x', (), 2], return_exceptions=True)
+    assert results[0] == 1
+    assert isinstance(results[1], InvalidArgError)
+    assert isinstance(results[2], MissingArgError)
+    assert results[3] == 2
+
+
+@mark.asyncio
+async def test_amap():
+    running = []
+    peak = []
+
+    @fashionable
+    async def double(x: int) -> str:
+        running.append(x)
+        peak.append(len(running))
+        await sleep(0.001)
+        running.remove(x)
+
+        if x < 0:
+            raise ValueError
+
+        return x * 2
+
+    assert await double.amap(range(10), limit=3) == [str(i * 2) for i in range(10)]
+    assert max(peak) == 3
+
+    results = await double.amap(['1', -1, 'x'], return_exceptions=True)
+    assert results[0] == '2'
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], InvalidArgError)
+
+    with raises(ValueError):
+        await double.amap([1, -1, 2])
+
+    with raises(ValueError):
+        await double.amap([1], limit=0)
+
+    @fashionable
+    def square(x: int) -> int:
+        return x * x
+
+    assert await square.amap(['2', 3]) == [4, 9]
+
+
+def test_method():
+    class A:
+        def __init__(self, k: int):
+            self.k = k
+
+        @fashionable
+        def mul(self, x: int, y: int = 1) -> int:
+            return self.k * x * y
+
+        @classmethod
+        @fashionable
+        def name(cls, suffix: str) -> str:
+            return cls.__name__ + suffix
+
+        @fashionable
+        def star(*args) -> int:
+            return len(args)
+
+    a = A(2)
+    assert a.mul('3') == 6
+    assert a.mul(x=3, y='2') == 12
+    assert A.mul(a, 3) == 6
+    assert a.name(1) == 'A1'
+    assert A.name('B') == 'AB'
+    assert a.star('1', 2) == 3
+
+    with raises(InvalidArgError):
+        a.mul('x')
+
+    with raises(MissingArgError):
+        a.mul()
+
+    with raises(TypeError):
+        a.mul(1, self=a)
+
+
+def test_predefined_method():
+    class A:
+        @fashionable
+        def mul(self, c: Ctx, x: int) -> int:
+            return c.x * x
+
+    assert A.mul[{Ctx: Ctx(2)}](A(), '3') == 6
+
+
+def test_profile():
+    class Sink(MetricsSink):
+        def __init__(self):
+            self.counts = []
+            self.observed = []
+
+        def count(self, owner, name, value=1):
+            self.counts.append((owner, name, value))
+
+        def observe(self, owner, name, value):
+            self.observed.append((owner, name))
+
+    sink = Sink()
+
+    @fashionable(profile_=sink)
+    def f(x: int) -> int:
+        return x if x > 0 else 'x'
+
+    assert f('1') == 1
+    assert f.stats()['counters'] == {'calls': 1}
+    assert sorted(f.stats()['histograms']) == ['body', 'in', 'out']
+
+    with raises(InvalidArgError):
+        f('x')
+
+    with raises(MissingArgError):
+        f()
+
+    with raises(RetError):
+        f(-1)
+
+    stats = f.stats()
+    assert stats['counters'] == {'calls': 4, 'InvalidArgError': 1, 'MissingArgError': 1, 'RetError': 1}
+    assert stats['histograms']['in']['count'] == 4
+    assert stats['histograms']['body']['count'] == 2
+    assert stats['histograms']['out']['count'] == 2
+    assert f.profile.name == 'test_decorator.test_profile.<locals>.f'
+    assert Profile.registry[f.profile.name] is f.profile
+    assert Profile.report()[f.profile.name] == stats
+    assert (f.profile.name, 'calls', 1) in sink.counts
+    assert (f.profile.name, 'body') in sink.observed
+    assert f.map([1, '2']) == [1, 2]
+    assert f.stats()['counters']['calls'] == 6
+
+    f.profile.clear()
+    assert f.stats() == {'counters': {}, 'histograms': {}}
+
+    @fashionable
+    def g():
+        pass
+
+    assert g.stats() == {}
+    assert g.profile is None
+
+    with raises(TypeError):
+        fashionable(profile_=object())(g.func)
+
+
+@mark.asyncio
+async def test_profile_async():
+    @fashionable(profile_=True, cache_=False)
+    async def f(x: int) -> int:
+        await sleep(0.01)
+        return x
+
+    assert await f('1') == 1
+    assert await f.amap(['2', 3]) == [2, 3]
+
+    stats = f.stats()
+    assert stats['counters'] == {'calls': 3}
+    assert stats['histograms']['body']['sum'] >= 0.03
+    assert stats['histograms']['in']['sum'] < stats['histograms']['body']['sum']
+
+    @fashionable(profile_=Profile(), cache_=True)
+    async def g(x: int) -> int:
+        return x
+
+    assert await g(1) == 1
+    assert await g(1) == 1
+
+    with raises(InvalidArgError):
+        await g('x')
+
+    assert g.stats()['counters'] == {'calls': 3, 'InvalidArgError': 1}
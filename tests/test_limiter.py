@@ -0,0 +1,117 @@
+from asyncio import gather, get_event_loop, new_event_loop, sleep, wait_for
+from threading import Thread
+
+from pytest import mark, raises
+
+from fashionable import ConcurrencyLimiter
+
+
+@mark.asyncio
+async def test_limiter():
+    limiter = ConcurrencyLimiter(2)
+    order = []
+    running = []
+
+    async def work(name: str, priority: int):
+        await limiter.acquire(priority)
+        running.append(name)
+        order.append(name)
+        assert len(running) <= 2
+        await sleep(0.001)
+        running.remove(name)
+        limiter.release()
+
+    await gather(
+        work('a', ConcurrencyLimiter.BACKGROUND),
+        work('b', ConcurrencyLimiter.BACKGROUND),
+        work('c', ConcurrencyLimiter.BACKGROUND),
+        work('d', ConcurrencyLimiter.INTERACTIVE),
+        work('e', ConcurrencyLimiter.BACKGROUND),
+        work('f', ConcurrencyLimiter.INTERACTIVE),
+    )
+
+    assert order == ['a', 'b', 'd', 'f', 'c', 'e']
+    assert limiter.active == 0
+    assert limiter.depth == 0
+
+
+@mark.asyncio
+async def test_limiter_cancel():
+    limiter = ConcurrencyLimiter(1)
+    await limiter.acquire()
+    waiter = get_event_loop().create_task(limiter.acquire())
+    await sleep(0)
+    assert limiter.depth == 1
+
+    waiter.cancel()
+    await sleep(0)
+    assert limiter.depth == 0
+
+    limiter.release()
+    assert limiter.active == 0
+    await limiter.acquire()
+    assert limiter.active == 1
+
+
+@mark.asyncio
+async def test_limiter_promote():
+    limiter = ConcurrencyLimiter(1)
+    order = []
+
+    async def work(name: str):
+        await limiter.acquire(ConcurrencyLimiter.BACKGROUND)
+        order.append(name)
+        limiter.release()
+
+    await limiter.acquire()
+    loop = get_event_loop()
+    tasks = [loop.create_task(work(n)) for n in 'abc']
+    limiter.promote(tasks[2])
+    await sleep(0)
+    limiter.promote(tasks[1])
+    limiter.promote(tasks[1], ConcurrencyLimiter.BACKGROUND)
+    limiter.release()
+    await gather(*tasks)
+    assert order == ['b', 'c', 'a']
+    assert not limiter._promoted
+
+
+def test_limiter_limit():
+    with raises(ValueError):
+        ConcurrencyLimiter(0)
+
+
+def test_limiter_threads():
+    limiter = ConcurrencyLimiter(1)
+    done = []
+    errors = []
+
+    async def work():
+        for _ in range(20):
+            await wait_for(limiter.acquire(), 1)
+            await sleep(0.001)
+            limiter.release()
+
+        done.append(True)
+
+    def run():
+        loop = new_event_loop()
+
+        try:
+            loop.run_until_complete(work())
+        except BaseException as exc:
+            errors.append(exc)
+        finally:
+            loop.close()
+
+    threads = [Thread(target=run) for _ in range(3)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(done) == 3
+    assert limiter.active == 0
@@ -1,7 +1,8 @@
 from copy import copy, deepcopy
+from threading import current_thread
 from typing import Dict, List, Optional
 
-from pytest import fail, raises
+from pytest import fail, mark, raises
 
 from fashionable import Attribute, FashionableError, Model, ModelError
 
@@ -441,3 +442,28 @@ def test_to_dict():
         }
     }
     assert m.to_dict() == d
+
+
+@mark.asyncio
+async def test_acreate():
+    threads = []
+
+    class Tracked(str):
+        def __new__(cls, value):
+            threads.append(current_thread())
+            return super().__new__(cls, value)
+
+    class M(Model):
+        a = Attribute(Tracked)
+        b = Attribute(Optional[List[int]])
+
+    assert await M.acreate('x', b=[1]) == M('x', [1])
+    assert threads[0] is current_thread()
+
+    threads.clear()
+    m = await M.acreate(a='y' * 100000)
+    assert m.a == 'y' * 100000
+    assert threads[0] is not current_thread()
+
+    with raises(ModelError):
+        await M.acreate('z', b=['x'] * 100000)
@@ -0,0 +1,23 @@
+from fashionable import Histogram, Stats
+
+
+def test_histogram():
+    h = Histogram((1, 5))
+    h.observe(0.5)
+    h.observe(1)
+    h.observe(3)
+    h.observe(10)
+    assert h.to_dict() == {'count': 4, 'sum': 14.5, 'buckets': {1: 2, 5: 1, float('inf'): 1}}
+
+
+def test_stats():
+    s = Stats()
+    s.count('hit')
+    s.count('hit', 2)
+    s.observe('_get', 0.01)
+    d = s.to_dict()
+    assert d['counters'] == {'hit': 3}
+    assert d['histograms']['_get']['count'] == 1
+
+    s.clear()
+    assert s.to_dict() == {'counters': {}, 'histograms': {}}
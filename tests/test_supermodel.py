@@ -1,12 +1,34 @@
-from asyncio import sleep
+from asyncio import gather, get_event_loop, new_event_loop, set_event_loop, sleep, wait_for
+from concurrent.futures import ThreadPoolExecutor
+from gc import collect as collect_garbage
+from threading import Thread, current_thread
 from time import time
-from typing import AsyncIterator, Optional
+from typing import AsyncIterator, List, Optional
 
 from pytest import mark, raises
 
-from fashionable import Attribute, Supermodel
+from fashionable import AdaptiveTTL, Attribute, MetricsSink, ModelConflictError, NOT_MODIFIED, Ref, Session, Supermodel
 
 
+class AIter(AsyncIterator):
+    def __init__(self, items: list):
+        self._iter = iter(items)
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+async def collect(iterator: AsyncIterator) -> list:
+    items = []
+
+    async for item in iterator:
+        items.append(item)
+
+    return items
+
 # noinspection PyAbstractClass
 def test_supermodel():
     class S(Supermodel):
@@ -304,3 +326,1256 @@ async def test_cancel():
     S.close()
     assert not getattr(S, '.expire_handles')
     assert not getattr(S, '.refresh_tasks')
+
+
+# noinspection PyAbstractClass,PyProtectedMember
+def test_flush_options():
+    class S1(Supermodel):
+        a = Attribute(int)
+
+    class S2(S1):
+        _flush_interval = 0.5
+        _flush_size = 100
+
+    assert not S1._write_behind
+    assert S2._write_behind
+    assert S2._flush_interval == 0.5
+    assert S2._flush_size == 100
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S(Supermodel):
+            _flush_interval = '1'
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S(Supermodel):
+            _flush_size = 1.5
+
+
+@mark.asyncio
+async def test_write_behind():
+    updates = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _flush_interval = 0.01
+
+        a = Attribute(str)
+        b = Attribute(int)
+
+        @staticmethod
+        async def _create(raw: dict):
+            return raw
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            pass
+
+        @staticmethod
+        async def _update(id_: str, raw: dict):
+            updates.append((id_, raw))
+
+    s1 = await S.create('s1', 1)
+    s2 = await S.create('s2', 1)
+
+    for b in range(2, 5):
+        await s1.update(b=b)
+        await s2.update(b=b * 10)
+
+    assert s1.b == 4
+    assert (await S.get('s1')).b == 4
+    assert not updates
+
+    await sleep(0.02)
+    assert sorted(updates) == [('s1', {'a': 's1', 'b': 4}), ('s2', {'a': 's2', 'b': 40})]
+
+    updates.clear()
+    await s1.update(b=5)
+    await S.close()
+    assert updates == [('s1', {'a': 's1', 'b': 5})]
+    assert S.close() is None
+
+
+@mark.asyncio
+async def test_write_behind_pending():
+    db = {1: {'a': 1, 'n': 0}}
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _ttl = 0.01
+        _flush_interval = 1
+
+        a = Attribute(int)
+        n = Attribute(int)
+
+        @staticmethod
+        async def _get(id_: int) -> Optional[dict]:
+            return dict(db[id_])
+
+        @classmethod
+        async def _update_many(cls, raws: dict):
+            db.update(raws)
+
+    await (await S.get(1)).update(n=5)
+    await sleep(0.02)
+    assert S.peek(1, stale=False) is None
+    assert (await S.get(1, fresh=True)).n == 5
+    assert db[1]['n'] == 0
+    await S.close()
+    assert db[1]['n'] == 5
+
+
+@mark.asyncio
+async def test_write_behind_get_many():
+    db = {'a': {'a': 'a', 'v': 1}, 'b': {'a': 'b', 'v': 2}}
+    reads = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _ttl = 0.01
+        _flush_interval = 1
+        _ttl_policy = AdaptiveTTL(0.01, 1)
+
+        a = Attribute(str)
+        v = Attribute(int)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            return dict(db[id_])
+
+        @staticmethod
+        async def _get_many(ids: list) -> dict:
+            return {i: dict(db[i]) for i in ids}
+
+        @classmethod
+        async def _update_many(cls, raws: dict):
+            db.update(raws)
+
+    S._ttl_policy.read = reads.append
+    await (await S.get('a')).update(v=5)
+    await sleep(0.02)
+    models = await S.get_many(['a', 'b'])
+    assert (models['a'].v, models['b'].v) == (5, 2)
+    assert S.peek('a', stale=False).v == 5
+
+    await S.get_many(['a'])
+    assert reads == ['a']
+    await S.close()
+
+
+def test_write_behind_close(caplog):
+    updates = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _flush_interval = 1
+
+        a = Attribute(int)
+        n = Attribute(int)
+
+        @classmethod
+        async def _update_many(cls, raws: dict):
+            updates.append(raws)
+
+    loop = new_event_loop()
+
+    try:
+        loop.run_until_complete(S(1, 0).update(n=1))
+        set_event_loop(loop)
+        assert S.close() is None
+        assert updates == [{1: {'a': 1, 'n': 1}}]
+
+        loop.run_until_complete(S(2, 0).update(n=2))
+    finally:
+        set_event_loop(None)
+        loop.close()
+
+    S.close()
+    assert len(updates) == 1
+    assert 'Closing S with 1 unflushed writes' in caplog.text
+
+
+@mark.asyncio
+async def test_write_behind_size():
+    batches = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _flush_size = 2
+
+        a = Attribute(str)
+        b = Attribute(int)
+
+        @staticmethod
+        async def _create(raw: dict):
+            return raw
+
+        @staticmethod
+        async def _update_many(raws: dict):
+            batches.append(raws)
+
+    s1 = await S.create('s1', 1)
+    s2 = await S.create('s2', 1)
+    await s1.update(b=2)
+    await s1.update(b=3)
+    await sleep(0)
+    assert not batches
+
+    await s2.update(b=2)
+    await sleep(0)
+    assert batches == [{'s1': {'a': 's1', 'b': 3}, 's2': {'a': 's2', 'b': 2}}]
+
+
+@mark.asyncio
+async def test_find_cached():
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _ttl = 0.01
+
+        id = Attribute(str)
+        email = Attribute(str, index=True)
+        age = Attribute(int, index=True)
+        name = Attribute(Optional[str])
+
+        @staticmethod
+        async def _create(raw: dict):
+            return raw
+
+        @staticmethod
+        async def _update(id_: str, raw: dict):
+            pass
+
+        @staticmethod
+        async def _find(**kwargs) -> AsyncIterator[dict]:
+            raise AssertionError
+
+    await S.create('u1', 'a@x', 20, 'A')
+    await S.create('u2', 'b@x', 30)
+    u3 = await S.create('u3', 'c@x', 40, 'C')
+
+    assert [u.id for u in await collect(await S.find(cached_=True, email='b@x'))] == ['u2']
+    assert [u.id for u in await collect(await S.find(cached_=True, age='30'))] == ['u2']
+    assert [u.id for u in await collect(await S.find(cached_=True, age=slice(25, None)))] == ['u2', 'u3']
+    assert [u.id for u in await collect(await S.find(cached_=True, age=slice(None, 40), name='A'))] == ['u1']
+    assert [u.id for u in await collect(await S.find(cached_=True, email='nobody'))] == []
+    assert len(await collect(await S.find(cached_=True))) == 3
+
+    await u3.update(email='d@x')
+    assert [u.id for u in await collect(await S.find(cached_=True, email='c@x'))] == []
+    assert [u.id for u in await collect(await S.find(cached_=True, email='d@x'))] == ['u3']
+
+    with raises(TypeError):
+        await S.find(cached_=True, unknown=1)
+
+    await sleep(0.02)
+    assert await collect(await S.find(cached_=True, age=slice(None, None))) == []
+    S.close()
+
+
+@mark.asyncio
+async def test_find_ttl():
+    finds = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _find_ttl = 0.02
+
+        a = Attribute(str)
+        b = Attribute(int)
+
+        @staticmethod
+        async def _create(raw: dict):
+            pass
+
+        @staticmethod
+        async def _update(id_: str, raw: dict):
+            pass
+
+        @staticmethod
+        async def _delete(id_: str):
+            pass
+
+        @staticmethod
+        async def _find(**kwargs) -> AsyncIterator[dict]:
+            finds.append(kwargs)
+            rows = [{'a': '1', 'b': 1}, {'a': '2', 'b': 2}, {'a': '3', 'b': 1}]
+            return AIter([r for r in rows if 'b' not in kwargs or r['b'] == kwargs['b']])
+
+        @staticmethod
+        def _matches(model: Supermodel, **kwargs) -> bool:
+            return 'b' not in kwargs or model.b == kwargs['b']
+
+    assert [s.a for s in await collect(await S.find(b=1))] == ['1', '3']
+    assert [s.a for s in await collect(await S.find(b=1))] == ['1', '3']
+    assert [s.a for s in await collect(await S.find(b=2))] == ['2']
+    assert finds == [{'b': 1}, {'b': 2}]
+
+    await S.create('4', 2)
+    assert [s.a for s in await collect(await S.find(b=1))] == ['1', '3']
+    assert len(finds) == 2
+    await collect(await S.find(b=2))
+    assert len(finds) == 3
+
+    s1 = await S.get('1')
+    await s1.update(b=5)
+    await collect(await S.find(b=1))
+    await collect(await S.find(b=2))
+    assert len(finds) == 4
+
+    await (await S.get('2')).delete()
+    await collect(await S.find(b=1))
+    await collect(await S.find(b=2))
+    assert len(finds) == 5
+
+    await sleep(0.03)
+    await collect(await S.find(b=1))
+    assert len(finds) == 6
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S1(Supermodel):
+            _find_ttl = '1'
+
+    S.close()
+
+
+@mark.asyncio
+async def test_prefetch():
+    fetched = []
+
+    class SIter(AsyncIterator):
+        def __init__(self):
+            self._iter = iter(range(10))
+
+        async def __anext__(self) -> dict:
+            for a in self._iter:
+                fetched.append(a)
+                return {'a': a}
+
+            raise StopAsyncIteration
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _prefetch = 3
+
+        a = Attribute(int)
+
+        @staticmethod
+        async def _find(**kwargs) -> AsyncIterator[dict]:
+            return SIter()
+
+    iterator = (await S.find()).__aiter__()
+    assert (await iterator.__anext__()).a == 0
+    await sleep(0.01)
+    assert fetched == [0, 1, 2, 3, 4]
+    assert [s.a for s in await collect(iterator)] == list(range(1, 10))
+
+    with raises(StopAsyncIteration):
+        await iterator.__anext__()
+
+    assert [s.a for s in await collect((await S.find()).prefetch(None))] == list(range(10))
+
+    chunks = []
+
+    async for chunk in (await S.find()).chunks(4):
+        chunks.append([s.a for s in chunk])
+
+    assert chunks == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+    with raises(ValueError):
+        (await S.find()).chunks(0)
+
+    iterator = (await S.find()).__aiter__()
+    await iterator.__anext__()
+    iterator.close()
+
+    iterator = await S.find()
+
+    async for _ in iterator:
+        break
+
+    producer = iterator.producer
+    del iterator
+    collect_garbage()
+    await sleep(0)
+    assert producer.cancelled()
+
+    chunks = (await S.find()).chunks(2)
+
+    async for _ in chunks:
+        break
+
+    producer = chunks.iterator.producer
+    await chunks.aclose()
+    await sleep(0)
+    assert producer.cancelled()
+
+
+@mark.asyncio
+async def test_prefetch_error():
+    class SIter(AsyncIterator):
+        async def __anext__(self) -> dict:
+            raise RuntimeError
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _prefetch = 2
+
+        a = Attribute(int)
+
+        @staticmethod
+        async def _find(**kwargs) -> AsyncIterator[dict]:
+            return SIter()
+
+    with raises(RuntimeError):
+        await collect(await S.find())
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S1(Supermodel):
+            _prefetch = 1.5
+
+
+class Snap(Supermodel):
+    _ttl = 0.05
+
+    a = Attribute(str)
+    b = Attribute(int)
+
+    @staticmethod
+    async def _create(raw: dict):
+        pass
+
+    @staticmethod
+    async def _get(id_: str) -> Optional[dict]:
+        return {'a': id_, 'b': -1}
+
+    @staticmethod
+    async def _find(**kwargs) -> AsyncIterator[dict]:
+        return AIter([{'a': str(i), 'b': i} for i in range(kwargs['n'])])
+
+
+@mark.asyncio
+async def test_snapshot(tmp_path):
+    path = str(tmp_path / 'snap')
+    await Snap.create('s1', 1)
+    await Snap.create('s2', 2)
+    await sleep(0.03)
+    await Snap.create('s3', 3)
+    getattr(Snap, '.trash')['s4'] = Snap('s4', 4)
+
+    assert Snap.snapshot(path) == 4
+    Snap.close()
+    getattr(Snap, '.cache').clear()
+    getattr(Snap, '.trash').clear()
+
+    assert Snap.warm(path) == 4
+    assert getattr(Snap, '.cache')['s1'].b == 1
+    assert (await Snap.get('s3')).b == 3
+    assert (await Snap.get('s4')).b == 4
+    assert Snap.warm(path) == 0
+
+    await sleep(0.03)
+    assert 's1' not in getattr(Snap, '.cache')
+    assert 's3' in getattr(Snap, '.cache')
+    Snap.close()
+
+
+@mark.asyncio
+async def test_snapshot_downtime(tmp_path):
+    path = str(tmp_path / 'snap')
+    getattr(Snap, '.cache').clear()
+    getattr(Snap, '.trash').clear()
+    await Snap.create('s1', 1)
+    await sleep(0.03)
+    await Snap.create('s2', 2)
+
+    assert Snap.snapshot(path) == 2
+    Snap.close()
+    getattr(Snap, '.cache').clear()
+    getattr(Snap, '.trash').clear()
+    await sleep(0.03)
+
+    assert Snap.warm(path) == 2
+    assert 's1' not in getattr(Snap, '.cache')
+    assert getattr(Snap, '.trash')['s1'].b == 1
+    assert getattr(Snap, '.cache')['s2'].b == 2
+
+    await sleep(0.03)
+    assert 's2' not in getattr(Snap, '.cache')
+    Snap.close()
+    getattr(Snap, '.trash').clear()
+
+
+@mark.asyncio
+async def test_warm_from_find():
+    assert await Snap.warm_from_find(n=5) == 5
+    assert (await Snap.get('4')).b == 4
+    Snap.close()
+
+
+@mark.asyncio
+async def test_stats():
+    class Sink(MetricsSink):
+        def __init__(self):
+            self.counts = []
+            self.observed = []
+            self.gauges = {}
+
+        def count(self, owner: str, name: str, value: int = 1):
+            self.counts.append((owner, name, value))
+
+        def observe(self, owner: str, name: str, value: float):
+            self.observed.append((owner, name))
+
+        def gauge(self, owner: str, name: str, value: float):
+            self.gauges[name] = value
+
+    sink = Sink()
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _ttl = 0.01
+        _metrics = sink
+
+        a = Attribute(str)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            return {'a': id_}
+
+        @staticmethod
+        async def _delete(id_: str):
+            pass
+
+    s1 = await S.get('s1')
+    await S.get('s1')
+    await sleep(0.02)
+    await S.get('s1')
+    await sleep(0.001)
+    await s1.delete()
+
+    stats = S.stats()
+    assert stats['counters'] == {'miss': 2, 'hit': 1, 'expire': 1, 'trash_hit': 1, 'evict': 1}
+    assert stats['histograms']['_get']['count'] == 2
+    assert stats['histograms']['_delete']['count'] == 1
+    assert stats['gauges'] == {'cache_size': 0, 'trash_size': 0, 'refreshes': 0, 'pending': 0, 'queue_depth': 0}
+    assert ('S', 'hit', 1) in sink.counts
+    assert sink.observed.count(('S', '_get')) == 2
+
+    S.report()
+    assert sink.gauges['cache_size'] == 0
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S1(Supermodel):
+            _metrics = object()
+
+    S.close()
+
+
+@mark.asyncio
+async def test_concurrency():
+    running = []
+    peak = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _ttl = 0.01
+        _concurrency = 2
+
+        a = Attribute(str)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            running.append(id_)
+            peak.append(len(running))
+            await sleep(0.001)
+            running.remove(id_)
+            return {'a': id_}
+
+    await gather(*(S.get(str(i)) for i in range(10)))
+    assert max(peak) == 2
+    assert S.stats()['gauges']['queue_depth'] == 0
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S1(Supermodel):
+            _concurrency = 1.5
+
+    S.close()
+
+
+@mark.asyncio
+async def test_peek():
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _ttl = 0.01
+
+        a = Attribute(str)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            return {'a': id_}
+
+    assert S.peek('s1') is None
+    s1 = await S.get('s1')
+    assert S.peek('s1') is s1
+    assert S.get_cached('s1') is s1
+
+    await sleep(0.02)
+    assert S.peek('s1') is s1
+    assert S.peek('s1', stale=False) is None
+    assert S.stats()['counters'] == {'miss': 1, 'hit': 2, 'trash_hit': 1, 'expire': 1}
+    S.close()
+
+
+@mark.asyncio
+async def test_conditional_refresh():
+    calls = []
+    db = {'s1': {'a': 's1', 'rev': 1, 'b': 'x'}}
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _ttl = 0.01
+        _version = 'rev'
+
+        a = Attribute(str)
+        rev = Attribute(int)
+        b = Attribute(str)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            calls.append('get')
+            return db.get(id_)
+
+        @staticmethod
+        async def _get_if_changed(id_: str, version: int):
+            calls.append(('get_if_changed', version))
+            raw = db.get(id_)
+            return NOT_MODIFIED if raw and raw['rev'] == version else raw
+
+    s1 = await S.get('s1')
+    await sleep(0.02)
+    assert (await S.get('s1', fresh=True)) is s1
+    assert calls == ['get', ('get_if_changed', 1)]
+    assert S.stats()['counters']['not_modified'] == 1
+
+    db['s1'] = {'a': 's1', 'rev': 2, 'b': 'y'}
+    await sleep(0.02)
+    s2 = await S.get('s1', fresh=True)
+    assert s2.b == 'y'
+    assert calls[-1] == ('get_if_changed', 1)
+
+    with raises(ValueError):
+        # noinspection PyUnusedLocal
+        class S1(Supermodel):
+            _version = 'missing'
+
+            a = Attribute(str)
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S2(Supermodel):
+            _version = 1
+
+    S.close()
+
+
+@mark.asyncio
+async def test_optimistic_update():
+    db = {'s1': {'a': 's1', 'rev': 1, 'b': 'x', 'c': 0}}
+    calls = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _version = 'rev'
+
+        a = Attribute(str)
+        rev = Attribute(int)
+        b = Attribute(str)
+        c = Attribute(int)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            calls.append('get')
+            return dict(db[id_])
+
+        @staticmethod
+        async def _update_if(id_: str, expected_version: int, changes: dict):
+            calls.append(('update_if', expected_version, changes))
+            raw = db[id_]
+
+            if raw['rev'] != expected_version:
+                return None
+
+            raw.update(changes, rev=expected_version + 1)
+            return raw['rev']
+
+    s1 = await S.get('s1')
+    await s1.update(b='y')
+    assert calls == ['get', ('update_if', 1, {'b': 'y'})]
+    assert s1.rev == 2
+    assert (await S.get('s1')) is s1
+
+    db['s1'] = {'a': 's1', 'rev': 5, 'b': 'z', 'c': 7}
+    await s1.update(b='w')
+    assert calls[2:] == [('update_if', 2, {'b': 'w'}), 'get', ('update_if', 5, {'b': 'w'})]
+    assert (s1.rev, s1.b, s1.c) == (6, 'w', 7)
+    assert db['s1'] == {'a': 's1', 'rev': 6, 'b': 'w', 'c': 7}
+    await sleep(0)
+    assert S.peek('s1') is s1
+
+    db['s1']['rev'] = 10
+
+    with raises(ModelConflictError) as err:
+        await s1.update(retries_=0, b='v')
+
+    assert str(err.value) == 'Invalid S: conflicting version 6'
+    S.close()
+
+
+# noinspection PyAbstractClass,PyProtectedMember
+def test_negative_ttl():
+    class S1(Supermodel):
+        _ttl = 5
+
+        a = Attribute(int)
+
+    class S2(S1):
+        _negative_ttl = 1
+
+    assert S1._negative_ttl == 5
+    assert S2._negative_ttl == 1
+    assert S2._ttl_for(None) == 1
+    assert S2._ttl_for(S2(1)) == 5
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S(Supermodel):
+            _negative_ttl = '1'
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S(Supermodel):
+            _ttl_policy = 1
+
+
+@mark.asyncio
+async def test_negative_ttl_expire():
+    calls = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _negative_ttl = 0.01
+
+        a = Attribute(str)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            calls.append(id_)
+            return {'a': id_} if len(calls) > 1 else None
+
+    assert await S.get('s1') is None
+    assert await S.get('s1') is None
+    assert calls == ['s1']
+    await sleep(0.02)
+    assert await S.get('s1') is None
+    await sleep(0.01)
+    assert (await S.get('s1')).a == 's1'
+    assert calls == ['s1', 's1']
+    S.close()
+
+
+@mark.asyncio
+async def test_adaptive_ttl():
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _ttl = 2
+        _ttl_policy = AdaptiveTTL(1, 8, reads=2)
+
+        a = Attribute(str)
+        b = Attribute(int, default=0)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            return {'a': id_}
+
+        @staticmethod
+        async def _update(id_: str, raw: dict):
+            pass
+
+    s = await S.get('s1')
+    assert S._ttl_policy._entries['s1'][0] == 2
+
+    await S.get('s1')
+    await S.get('s1')
+    assert S._ttl_for(s) == 4
+
+    await s.update(b=1)
+    assert S._ttl_policy._entries['s1'][0] == 2
+    S.close()
+
+
+@mark.asyncio
+async def test_sync_hooks():
+    threads = set()
+    chunks = []
+
+    def rows(n: int):
+        for i in range(n):
+            if i % 2 == 0:
+                chunks.append(current_thread().name)
+
+            yield {'a': str(i)}
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _executor = 2
+        _chunk_size = 2
+
+        a = Attribute(str)
+        b = Attribute(int, default=0)
+
+        @staticmethod
+        def _create(raw: dict):
+            threads.add(current_thread())
+            return raw
+
+        @staticmethod
+        def _get(id_: str) -> Optional[dict]:
+            threads.add(current_thread())
+            return {'a': id_}
+
+        @staticmethod
+        def _find(n: int):
+            return rows(n)
+
+        @staticmethod
+        def _update(id_: str, raw: dict):
+            threads.add(current_thread())
+
+    assert (await S.create('s1')).a == 's1'
+    assert (await S.get('s2')).a == 's2'
+    await (await S.get('s2')).update(b=1)
+    assert [s.a for s in await collect(await S.find(n=5))] == ['0', '1', '2', '3', '4']
+    assert len(chunks) == 3
+    assert current_thread() not in threads
+    assert current_thread().name not in chunks
+    S.close()
+
+
+# noinspection PyAbstractClass,PyProtectedMember
+def test_executor_options():
+    class S1(Supermodel):
+        a = Attribute(int)
+
+    class S2(S1):
+        _executor = 1
+        _chunk_size = 10
+
+    assert S1._executor is None
+    assert S1._chunk_size == 100
+    assert S2._executor._max_workers == 1
+    assert S2._chunk_size == 10
+
+    executor = S2._executor
+    S2._executor = 2
+    assert executor._shutdown
+    executor = S2._executor
+    S2.close()
+    assert executor._shutdown
+    assert S2._executor is None
+
+    shared = ThreadPoolExecutor(1)
+    S1._executor = shared
+    S1.close()
+    assert not shared._shutdown
+    assert S1._executor is shared
+    shared.shutdown()
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S(Supermodel):
+            _executor = '1'
+
+    with raises(TypeError):
+        # noinspection PyUnusedLocal
+        class S(Supermodel):
+            _chunk_size = '1'
+
+
+def test_threads():
+    calls = []
+    errors = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _ttl = 0.05
+
+        a = Attribute(str)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            calls.append(id_)
+            await sleep(0.001)
+            return {'a': id_}
+
+    async def work(n: int):
+        for i in range(n):
+            assert (await S.get(str(i % 10))).a == str(i % 10)
+
+        await sleep(0.06)
+        S.close()
+
+    def run():
+        loop = new_event_loop()
+
+        try:
+            loop.run_until_complete(work(200))
+        except BaseException as exc:
+            errors.append(exc)
+        finally:
+            loop.close()
+
+    threads = [Thread(target=run) for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(calls) < 4 * 200
+    assert not getattr(S, '.refresh_tasks')
+    assert S.stats()['gauges']['cache_size'] + S.stats()['gauges']['trash_size'] == 10
+
+
+# noinspection PyAbstractClass,PyProtectedMember
+@mark.asyncio
+async def test_promote_refresh():
+    calls = []
+
+    class S(Supermodel):
+        _ttl = 0.01
+        _concurrency = 1
+
+        a = Attribute(str)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            calls.append(id_)
+            return {'a': id_}
+
+    for id_ in 'xyz':
+        await S.get(id_)
+
+    await sleep(0.02)
+    calls.clear()
+    await S._concurrency.acquire()
+
+    for id_ in 'yzx':
+        await S.get(id_)
+
+    fresh = get_event_loop().create_task(S.get('x', fresh=True))
+    await sleep(0)
+    S._concurrency.release()
+    assert (await fresh).a == 'x'
+    await sleep(0.005)
+    assert calls == ['x', 'y', 'z']
+    S.close()
+
+
+def test_threads_concurrency():
+    errors = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _concurrency = 1
+
+        a = Attribute(int)
+
+        @staticmethod
+        async def _get(id_: int) -> Optional[dict]:
+            await sleep(0.01)
+            return {'a': id_}
+
+    def run(id_: int):
+        loop = new_event_loop()
+
+        try:
+            assert loop.run_until_complete(wait_for(S.get(id_), 1)).a == id_
+        except BaseException as exc:
+            errors.append(exc)
+        finally:
+            loop.close()
+
+    threads = [Thread(target=run, args=(i,)) for i in range(3)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert S._concurrency.active == 0
+
+
+@mark.asyncio
+async def test_session():
+    calls = []
+
+    # noinspection PyAbstractClass
+    class S1(Supermodel):
+        _ttl = 0.01
+
+        a = Attribute(str)
+        b = Attribute(int, default=0)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            return {'a': id_}
+
+        @staticmethod
+        async def _update(id_: str, raw: dict):
+            calls.append(('update', id_))
+
+        @classmethod
+        async def _update_many(cls, raws: dict):
+            calls.append(('update_many', sorted(raws)))
+
+    # noinspection PyAbstractClass
+    class S2(S1):
+        pass
+
+    async with Supermodel.session() as session:
+        assert Session.current() is session
+        s1 = await S1.get('s1')
+        await sleep(0.02)
+        assert await S1.get('s1') is s1
+        await s1.update(b=1)
+        await s1.update(b=2)
+        await (await S1.get('s2')).update(b=3)
+        await (await S2.get('s3')).update(b=4)
+        assert not calls
+        assert session.dirty
+
+    assert calls == [('update_many', ['s1', 's2']), ('update_many', ['s3'])]
+    assert Session.current() is None
+    assert (await S1.get('s1')).b == 2
+
+    calls.clear()
+    await (await S1.get('s1')).update(b=5)
+    assert calls == [('update', 's1')]
+    S1.close()
+    S2.close()
+
+
+@mark.asyncio
+async def test_session_find():
+    finds = []
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        _find_ttl = 1
+
+        a = Attribute(int)
+
+        @staticmethod
+        async def _get(id_: int) -> Optional[dict]:
+            return {'a': id_}
+
+        @staticmethod
+        async def _find(**kwargs) -> AsyncIterator[dict]:
+            finds.append(kwargs)
+            return AIter([{'a': 1}, {'a': 2}])
+
+    async with S.session():
+        s1 = await S.get(1)
+        models = await collect(await S.find())
+        assert models[0] is s1
+        assert [s.a for s in models] == [1, 2]
+
+    assert [s.a for s in await collect(await S.find())] == [1, 2]
+    assert len(finds) == 1
+    S.close()
+
+
+@mark.asyncio
+async def test_session_fresh():
+    versions = {'s': 1}
+
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        a = Attribute(str)
+        v = Attribute(int)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            return {'a': id_, 'v': versions[id_]} if id_ in versions else None
+
+    async with S.session():
+        assert (await S.get('s')).v == 1
+        versions['s'] = 2
+        S._evict('s')
+        fresh = await S.get('s', fresh=True)
+        assert fresh.v == 2
+        assert await S.get('s') is fresh
+        del versions['s']
+        S._evict('s')
+        assert await S.get('s', fresh=True) is None
+        assert await S.get('s') is None
+
+    S.close()
+
+
+@mark.asyncio
+async def test_session_rollback():
+    # noinspection PyAbstractClass
+    class S(Supermodel):
+        a = Attribute(str)
+        b = Attribute(int, default=0)
+
+        @staticmethod
+        async def _get(id_: str) -> Optional[dict]:
+            return {'a': id_}
+
+        @classmethod
+        async def _update_many(cls, raws: dict):
+            raise RuntimeError
+
+    with raises(ValueError):
+        async with S.session():
+            await (await S.get('s1')).update(b=1)
+            raise ValueError
+
+    assert (await S.get('s1')).b == 0
+
+    with raises(RuntimeError):
+        async with S.session(concurrent=True):
+            await (await S.get('s1')).update(b=1)
+
+    assert (await S.get('s1')).b == 0
+    S.close()
+
+
+@mark.asyncio
+async def test_ref():
+    calls = []
+
+    # noinspection PyAbstractClass
+    class Org(Supermodel):
+        id = Attribute(int)
+        name = Attribute(str, default='')
+
+        @staticmethod
+        async def _get(id_: int) -> Optional[dict]:
+            calls.append(('get', id_))
+            return {'id': id_}
+
+        @staticmethod
+        async def _get_many(ids: list) -> dict:
+            calls.append(('get_many', sorted(ids)))
+            return {i: {'id': i} for i in ids if i != 9}
+
+    # noinspection PyAbstractClass
+    class Project(Supermodel):
+        id = Attribute(str)
+        org = Attribute(Optional[Ref[Org]])
+        orgs = Attribute(List[Ref[Org]], default=[])
+
+    assert Ref[Org] is Ref[Org]
+
+    with raises(TypeError):
+        Ref(1)
+
+    with raises(TypeError):
+        Ref[int]
+
+    p1 = Project('p1', '1')
+    assert isinstance(p1.org, Ref[Org])
+    assert p1.org.id == 1
+    assert p1.org == 1
+    assert p1.org.model is None
+    assert p1.to_dict() == {'id': 'p1', 'org': 1, 'orgs': []}
+    assert (await p1.org.get()).id == 1
+    assert p1.org.model.id == 1
+    assert Project(**p1.to_dict()) == p1
+
+    calls.clear()
+    projects = [p1, Project('p2', Org(2)), Project('p3', 3, orgs=[2, 3, 9]), Project('p4', None)]
+    orgs = await Project.resolve(projects, 'org')
+    assert [o and o.id for o in orgs] == [1, 2, 3, None]
+    assert calls == [('get_many', [2, 3])]
+    assert [o and o.id for o in (await Project.resolve(projects, 'orgs'))[2]] == [2, 3, None]
+    assert calls == [('get_many', [2, 3]), ('get_many', [9])]
+    assert await Project.resolve([Project('p5')], 'org') == [None]
+    Org.close()
+
+
+# noinspection PyAbstractClass,PyProtectedMember
+@mark.asyncio
+async def test_offload():
+    threads = []
+    storage = {}
+
+    class Tracked(str):
+        def __new__(cls, value):
+            threads.append(current_thread())
+            return super().__new__(cls, value)
+
+    class S(Supermodel):
+        _ttl = 1
+        _offload = 10
+        id = Attribute(int)
+        a = Attribute(Tracked)
+        b = Attribute(Optional[int])
+
+        @staticmethod
+        async def _create(raw: dict):
+            storage[raw['id']] = raw
+
+        @staticmethod
+        async def _get(id_: int) -> Optional[dict]:
+            return storage.get(id_)
+
+        @staticmethod
+        async def _update(id_: int, raw: dict):
+            storage[id_] = raw
+
+    with raises(TypeError):
+        class S1(Supermodel):
+            _offload = 1.
+
+    s = await S.create(1, 'x')
+    assert threads == [current_thread()]
+
+    threads.clear()
+    await S.create(2, 'x' * 11)
+    assert threads and current_thread() not in threads
+
+    threads.clear()
+    await s.update(a='x')
+    assert threads == [current_thread()]
+
+    threads.clear()
+    await s.update(a='y' * 11, b='2')
+    assert threads and current_thread() not in threads
+    assert (s.a, s.b) == ('y' * 11, 2)
+    assert storage[1] == {'id': 1, 'a': 'y' * 11, 'b': 2}
+
+    threads.clear()
+    storage[1] = {'id': 1, 'a': 'z' * 11}
+    S._evict(1)
+    assert (await S.get(1, fresh=True)).a == 'z' * 11
+    assert threads and current_thread() not in threads
+
+    threads.clear()
+    s3 = await S.acreate(3, 'w' * 11)
+    assert threads and current_thread() not in threads
+    assert storage[3] == {'id': 3, 'a': 'w' * 11}
+    assert await S.get(3) is s3
+    S.close()
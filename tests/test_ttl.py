@@ -0,0 +1,61 @@
+from pytest import raises
+
+from fashionable import AdaptiveTTL
+
+
+def test_adaptive_ttl():
+    policy = AdaptiveTTL(1, 8, reads=2)
+    assert policy.ttl('a', 2) == 2
+    assert policy.ttl('b') == 1
+    assert policy.ttl('c', 100) == 8
+
+    policy.read('a')
+    policy.read('a')
+    assert policy.ttl('a', 2) == 4
+
+    policy.read('a')
+    assert policy.ttl('a', 2) == 4
+
+    policy.read('a')
+    policy.write('a')
+    policy.read('a')
+    assert policy.ttl('a', 2) == 2
+
+    policy.write('a')
+    assert policy.ttl('a', 2) == 1
+
+    policy.write('a')
+    assert policy.ttl('a', 2) == 1
+
+    policy.forget('a')
+    policy.read('a')
+    assert policy.ttl('a', 3) == 3
+
+
+def test_adaptive_ttl_maxsize():
+    policy = AdaptiveTTL(1, 8, reads=1, maxsize=2)
+    policy.ttl('a', 2)
+    policy.ttl('b', 2)
+    policy.ttl('a', 2)
+    policy.ttl('c', 2)
+    assert list(policy._entries) == ['a', 'c']
+
+    policy.read('b')
+    assert policy.ttl('b', 2) == 2
+
+    policy.read('c')
+    assert policy.ttl('c', 2) == 4
+
+
+def test_adaptive_ttl_invalid():
+    with raises(ValueError):
+        AdaptiveTTL(0, 1)
+
+    with raises(ValueError):
+        AdaptiveTTL(2, 1)
+
+    with raises(ValueError):
+        AdaptiveTTL(1, 2, factor=1)
+
+    with raises(ValueError):
+        AdaptiveTTL(1, 2, maxsize=0)
@@ -1,8 +1,9 @@
+from threading import current_thread
 from typing import Any, Dict, List, Mapping, NewType, Optional, Set, Tuple, Type, TypeVar, Union
 
 from pytest import mark, raises
 
-from fashionable import Attribute, Model, UNSET, validate
+from fashionable import Attribute, Model, UNSET, avalidate, validate
 from fashionable.typedef import Typing
 
 Bool = NewType('Bool', bool)  # Because Union[float, int, bool] shrinks to Union[float, int]
@@ -88,3 +89,28 @@ def test_validate(typ, value, result):
 def test_fail(typ, value, exc):
     with raises(exc):
         validate(typ, value)
+
+
+@mark.asyncio
+async def test_avalidate():
+    threads = []
+
+    class Tracked(int):
+        def __new__(cls, value):
+            threads.append(current_thread())
+            return super().__new__(cls, value)
+
+    assert await avalidate(List[Tracked], ['1', '2'], threshold=4) == [1, 2]
+    assert threads == [current_thread()] * 2
+
+    threads.clear()
+    assert await avalidate(List[Tracked], ['1', '2', '3'], threshold=4) == [1, 2, 3]
+    assert len(threads) == 3
+    assert current_thread() not in threads
+
+    threads.clear()
+    assert await avalidate(Dict[str, Tracked], {'a': '1', 'b': '2'}, threshold=None) == {'a': 1, 'b': 2}
+    assert threads == [current_thread()] * 2
+
+    with raises(ValueError):
+        await avalidate(List[int], ['a'] * 10, threshold=1)